@@ -0,0 +1,124 @@
+# Any-angle paths that only keep the turning points. A straight line between two cells is walkable
+# when the player fits at every cell the line passes through, so the same footprint rules as the
+# grid steps apply. theta_star_search finds such paths directly (Theta*, Nash et al.), smooth_path
+# pulls the string on a path that was found on the grid.
+
+import math
+
+from priorityQueue import PriorityQueue
+
+
+def line_cells(a, b):
+    # Every cell the line between the centers of a and b passes through. Where it goes exactly
+    # through a corner both cells next to the corner are included.
+    x_cord, y_cord = a
+    dx = abs(b[0] - a[0])
+    dy = abs(b[1] - a[1])
+    x_step = 1 if b[0] > a[0] else -1
+    y_step = 1 if b[1] > a[1] else -1
+
+    cells = [a]
+    x_done = y_done = 0
+    while x_done < dx or y_done < dy:
+        decision = (1 + 2 * x_done) * dy - (1 + 2 * y_done) * dx
+        if decision == 0:
+            cells.append((x_cord + x_step, y_cord))
+            cells.append((x_cord, y_cord + y_step))
+            x_cord += x_step
+            y_cord += y_step
+            x_done += 1
+            y_done += 1
+        elif decision < 0:
+            x_cord += x_step
+            x_done += 1
+        else:
+            y_cord += y_step
+            y_done += 1
+        cells.append((x_cord, y_cord))
+    return cells
+
+
+def line_of_sight(grid, a, b, player_size):
+    # True if a player can walk straight from a to b, a itself is where it already stands
+    fits = grid.square_test(player_size)
+    for x_cord, y_cord in line_cells(a, b)[1:]:
+        if not fits(x_cord, y_cord):
+            return False
+    return True
+
+
+def path_length(path):
+    return sum(math.hypot(b[0] - a[0], b[1] - a[1]) for a, b in zip(path, path[1:]))
+
+
+def smooth_path(grid, path, player_size):
+    # Drops the points of path that the player can walk past in a straight line. path goes from
+    # the goal back to the start like get_path returns it.
+    if len(path) < 3:
+        return list(path)
+
+    walk = path[::-1]
+    smoothed = [walk[0]]
+    anchor = walk[0]
+    for previous, coord in zip(walk[1:], walk[2:]):
+        if not line_of_sight(grid, anchor, coord, player_size):
+            smoothed.append(previous)
+            anchor = previous
+    smoothed.append(walk[-1])
+
+    smoothed.reverse()
+    return smoothed
+
+
+def theta_star_search(grid, start, goal, player_size, max_cost=50):
+    # returns (path, cost) like Grid.get_path but with only the turning points in the path
+    start_cell = grid.get_cell(start)
+    if start_cell.is_obstacle or grid.get_cell(goal).is_obstacle:
+        return [], -1
+
+    frontier = PriorityQueue()
+    estimate = math.hypot(goal[0] - start[0], goal[1] - start[1])
+    frontier.put(start, (estimate, estimate))
+    came_from = {start: None}
+    cost_so_far = {start: 0}
+    # cells are not updated again once expanded, the cells that took them as parent depend on them
+    closed = set()
+    stats = getattr(grid, 'stats', None)
+
+    while not frontier.empty():
+        current = frontier.get()
+        if stats is not None:
+            stats.expand(current)
+        if current == goal:
+            break
+        closed.add(current)
+
+        parent = came_from[current]
+        for next_coord in grid.get_cell(current).neighbors(player_size):
+            if next_coord in closed:
+                continue
+            # skip the current cell if the parent can see the next one
+            if parent is not None and line_of_sight(grid, parent, next_coord, player_size):
+                origin = parent
+            else:
+                origin = current
+            new_cost = cost_so_far[origin] + math.hypot(next_coord[0] - origin[0], next_coord[1] - origin[1])
+            if new_cost >= max_cost:
+                continue
+            if next_coord not in cost_so_far or new_cost < cost_so_far[next_coord]:
+                cost_so_far[next_coord] = new_cost
+                came_from[next_coord] = origin
+                estimate = math.hypot(goal[0] - next_coord[0], goal[1] - next_coord[1])
+                frontier.put(next_coord, (new_cost + estimate, estimate))
+                if stats is not None:
+                    stats.push()
+
+    if goal not in came_from:
+        return [], -1
+
+    path = []
+    coord = goal
+    while coord is not None:
+        path.append(coord)
+        coord = came_from[coord]
+    return path, cost_so_far[goal]
@@ -0,0 +1,291 @@
+# Headless path finding benchmarks on fixed maps, for comparing versions of the grids.
+# Run with: python benchmarkSuite.py [--quick] [--output results.json] [--compare old.json]
+#
+# Every scenario is a map (random obstacles, a maze, rooms with doors or assets/grid.png) that is
+# loaded into Grid and DistanceGrid. For every algorithm and player size a fixed set of queries is
+# run and the results are written as JSON: queries found, nodes expanded, time per query, peak
+# memory and the cost compared to the shortest path on the grid.
+
+import argparse
+import heapq
+import json
+import math
+import os
+import platform
+import random
+import time
+import timeit
+
+from distanceGrid import DistanceGrid
+from grid import Grid
+from mapLoader import color_masks, mask_coords, read_png
+from searchStats import SearchStats
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+seed = 1
+query_count = 10
+player_sizes = (1, 2, 3, 5, 8, 10)
+algorithms = {
+    'Grid': ('astar', 'jps', 'bidirectional', 'theta'),
+    'DistanceGrid': ('astar', 'bidirectional', 'theta'),
+}
+
+# assets/grid.png next to this file, so the suite runs from any directory
+asset_map_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets', 'grid.png')
+
+# floor colors of assets/grid.png, every other tile is an obstacle
+asset_floor_colors = [
+    [192, 192, 191],
+    [102, 112, 102],
+    [91, 91, 91],
+    [168, 168, 168],
+]
+
+
+def random_map(width, height, density):
+    rnd = random.Random(seed)
+    return [(x, y) for x in range(width) for y in range(height) if rnd.random() < density]
+
+
+def maze_map(rooms_wide, rooms_high, corridor):
+    # Depth first maze of rooms_wide x rooms_high cells of corridor x corridor, with walls of one
+    # cell between them and around the maze
+    rnd = random.Random(seed)
+    step = corridor + 1
+    width = rooms_wide * step + 1
+    height = rooms_high * step + 1
+    walls = set((x, y) for x in range(width) for y in range(height) if x % step == 0 or y % step == 0)
+
+    visited = set([(0, 0)])
+    stack = [(0, 0)]
+    while stack:
+        room_x, room_y = stack[-1]
+        options = [(room_x + dx, room_y + dy) for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1))
+                   if 0 <= room_x + dx < rooms_wide and 0 <= room_y + dy < rooms_high and
+                   (room_x + dx, room_y + dy) not in visited]
+        if not options:
+            stack.pop()
+            continue
+
+        next_x, next_y = rnd.choice(options)
+        # open the wall between the rooms
+        if next_x != room_x:
+            x_wall = max(room_x, next_x) * step
+            for y in range(room_y * step + 1, room_y * step + step):
+                walls.discard((x_wall, y))
+        else:
+            y_wall = max(room_y, next_y) * step
+            for x in range(room_x * step + 1, room_x * step + step):
+                walls.discard((x, y_wall))
+        visited.add((next_x, next_y))
+        stack.append((next_x, next_y))
+    return sorted(walls)
+
+
+def room_map(rooms_wide, rooms_high, room_size, door_size):
+    # rooms_wide x rooms_high rooms of room_size with a door of door_size in every wall between them
+    rnd = random.Random(seed)
+    step = room_size + 1
+    width = rooms_wide * step + 1
+    height = rooms_high * step + 1
+    walls = set((x, y) for x in range(width) for y in range(height) if x % step == 0 or y % step == 0)
+
+    for room_x in range(rooms_wide):
+        for room_y in range(rooms_high):
+            if room_x + 1 < rooms_wide:
+                door = rnd.randrange(room_size - door_size + 1)
+                for y in range(door, door + door_size):
+                    walls.discard(((room_x + 1) * step, room_y * step + 1 + y))
+            if room_y + 1 < rooms_high:
+                door = rnd.randrange(room_size - door_size + 1)
+                for x in range(door, door + door_size):
+                    walls.discard((room_x * step + 1 + x, (room_y + 1) * step))
+    return sorted(walls)
+
+
+def asset_map(tile_size):
+    width, height, data = read_png(asset_map_path)
+    columns, rows, (floor,) = color_masks(data, width, height, tile_size, [asset_floor_colors])
+    return columns, rows, mask_coords(floor, columns, value=0)
+
+
+def with_size(obstacles):
+    width = max(x for x, _ in obstacles) + 1
+    height = max(y for _, y in obstacles) + 1
+    return width, height, obstacles
+
+
+def scenarios(quick=False):
+    # (name, width, height, obstacles) of every map
+    if quick:
+        maps = [
+            ('random_32', (32, 32, random_map(32, 32, 0.2))),
+            ('maze_4x4', with_size(maze_map(4, 4, 4))),
+            ('assets_16', asset_map(16)),
+        ]
+    else:
+        maps = [
+            ('random_64', (64, 64, random_map(64, 64, 0.2))),
+            ('random_128', (128, 128, random_map(128, 128, 0.2))),
+            ('maze_8x8', with_size(maze_map(8, 8, 6))),
+            ('maze_12x12', with_size(maze_map(12, 12, 10))),
+            ('rooms_4x4', with_size(room_map(4, 4, 20, 10))),
+            ('rooms_6x6', with_size(room_map(6, 6, 16, 6))),
+            ('assets_16', asset_map(16)),
+            ('assets_8', asset_map(8)),
+        ]
+    return [(name,) + size_and_obstacles for name, size_and_obstacles in maps]
+
+
+def make_queries(grid, width, height, player_size, count):
+    # count (start, goal) pairs in the largest connected region of the map, the same for every run.
+    # Goals that can't be reached would make the searches flood everything up to max_cost, and the
+    # small regions would mostly give trivial queries.
+    rnd = random.Random(seed * 1000 + player_size)
+    fits = grid.square_test(player_size)
+    regions = {}
+    cells = []
+    for x in range(width):
+        for y in range(height):
+            if (x, y) in regions or not fits(x, y):
+                continue
+            region = [(x, y)]
+            regions[(x, y)] = region
+            for coord in region:
+                for next_coord in grid.get_cell(coord).neighbors(player_size):
+                    if next_coord not in regions and 0 <= next_coord[0] < width and 0 <= next_coord[1] < height:
+                        regions[next_coord] = region
+                        region.append(next_coord)
+            if len(region) > max(len(cells), 1):
+                cells = region
+
+    return [(rnd.choice(cells), rnd.choice(cells)) for _ in range(count if cells else 0)]
+
+
+def shortest_cost(grid, start, goal, player_size, max_cost):
+    # Dijkstra over the grid moves, -1 if the goal can not be reached
+    costs = {start: 0}
+    frontier = [(0, start)]
+    while frontier:
+        cost, coord = heapq.heappop(frontier)
+        if coord == goal:
+            return cost
+        if cost > costs[coord]:
+            continue
+        for next_coord in grid.get_cell(coord).neighbors(player_size):
+            new_cost = cost + math.hypot(next_coord[0] - coord[0], next_coord[1] - coord[1])
+            if new_cost < max_cost and new_cost < costs.get(next_coord, max_cost):
+                costs[next_coord] = new_cost
+                heapq.heappush(frontier, (new_cost, next_coord))
+    return -1
+
+
+def run_case(grid, algorithm, queries, player_size, max_cost, optimal_costs):
+    # get_path goes through the path cache on Grid, search_path is the search itself
+    search = getattr(grid, 'search_path', grid.get_path)
+
+    grid.stats = SearchStats(heatmap=False)
+    started = timeit.default_timer()
+    results = [search(start, goal, player_size, max_cost, algorithm) for start, goal in queries]
+    elapsed = timeit.default_timer() - started
+    nodes_expanded = grid.stats.total.expanded
+    grid.stats = None
+
+    peak_memory = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+        for start, goal in queries:
+            search(start, goal, player_size, max_cost, algorithm)
+        peak_memory = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    ratios = [cost / optimal for (path, cost), optimal in zip(results, optimal_costs) if path and optimal > 0]
+    found = sum(1 for path, _ in results if path)
+    return {
+        'algorithm': algorithm,
+        'player_size': player_size,
+        'queries': len(queries),
+        'found': found,
+        'time_per_query_ms': 1000.0 * elapsed / max(len(queries), 1),
+        'nodes_expanded_per_query': nodes_expanded / float(max(len(queries), 1)),
+        'peak_memory_kb': None if peak_memory is None else peak_memory / 1024.0,
+        'optimality_mean': sum(ratios) / len(ratios) if ratios else None,
+        'optimality_max': max(ratios) if ratios else None,
+        'missed': sum(1 for (path, _), optimal in zip(results, optimal_costs) if not path and optimal >= 0),
+    }
+
+
+def run(quick=False, sizes=player_sizes, count=query_count, only=None):
+    results = []
+    for name, width, height, obstacles in scenarios(quick):
+        max_cost = 4 * (width + height)
+        for grid_class in (Grid, DistanceGrid):
+            grid = grid_class()
+            started = timeit.default_timer()
+            grid.set_cells_are_obstacles(obstacles)
+            build_time = timeit.default_timer() - started
+
+            for player_size in sizes:
+                queries = make_queries(grid, width, height, player_size, count)
+                optimal_costs = [shortest_cost(grid, start, goal, player_size, max_cost) for start, goal in queries]
+                for algorithm in algorithms[grid_class.__name__]:
+                    if only is not None and algorithm not in only:
+                        continue
+                    result = run_case(grid, algorithm, queries, player_size, max_cost, optimal_costs)
+                    result.update(scenario=name, grid=grid_class.__name__, width=width, height=height,
+                                  build_time_ms=1000.0 * build_time)
+                    results.append(result)
+                    print('{scenario} {grid} {algorithm} size {player_size}: {found}/{queries} found, '
+                          '{nodes_expanded_per_query:.0f} nodes, {time_per_query_ms:.2f} ms per query'.format(**result))
+    return results
+
+
+def case_key(result):
+    return result['scenario'], result['grid'], result['algorithm'], result['player_size']
+
+
+def compare(results, old_results):
+    # prints how time and nodes changed for the cases that are in both runs
+    old_cases = dict((case_key(result), result) for result in old_results)
+    for result in results:
+        old = old_cases.get(case_key(result), None)
+        if old is None:
+            continue
+        changes = []
+        for field in ('time_per_query_ms', 'nodes_expanded_per_query', 'peak_memory_kb', 'optimality_mean'):
+            if result[field] is not None and old.get(field):
+                changes.append('{} {:+.1%}'.format(field, result[field] / old[field] - 1))
+        print('{} {} {} size {}: {}'.format(*(case_key(result) + (', '.join(changes),))))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='path finding benchmarks')
+    parser.add_argument('--quick', action='store_true', help='small maps only')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(player_sizes), help='player sizes')
+    parser.add_argument('--queries', type=int, default=query_count, help='queries per case')
+    parser.add_argument('--algorithms', nargs='+', default=None, help='only run these algorithms')
+    parser.add_argument('--output', default=None, help='write the results to this JSON file')
+    parser.add_argument('--compare', default=None, help='JSON file of an earlier run to compare with')
+    arguments = parser.parse_args()
+
+    results = run(arguments.quick, arguments.sizes, arguments.queries, arguments.algorithms)
+    if arguments.output is not None:
+        with open(arguments.output, 'w') as output_file:
+            json.dump({
+                'python': platform.python_version(),
+                'time': time.strftime('%Y-%m-%d %H:%M:%S'),
+                'seed': seed,
+                'results': results,
+            }, output_file, indent=2, sort_keys=True)
+
+    if arguments.compare is not None:
+        with open(arguments.compare) as compare_file:
+            compare(results, json.load(compare_file)['results'])
+
+
+if __name__ == '__main__':
+    main()
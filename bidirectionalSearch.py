@@ -0,0 +1,95 @@
+# Bidirectional A*, one search from the start and one backwards from the goal that meet in the
+# middle. Works on any grid with get_cell(coord).neighbors(player_size), the backwards search looks
+# for the cells that have a cell as a neighbor so footprint rules only live in the grids.
+
+import math
+
+from heuristics import movement_heuristic
+from priorityQueue import PriorityQueue
+
+
+def predecessors(grid, coord, player_size):
+    # cells that can step to coord
+    x_cord, y_cord = coord
+    cells = []
+    for x in range(x_cord - 1, x_cord + 2):
+        for y in range(y_cord - 1, y_cord + 2):
+            if (x != x_cord or y != y_cord) and coord in grid.get_cell((x, y)).neighbors(player_size):
+                cells.append((x, y))
+    return cells
+
+
+def bidirectional_search(grid, start, goal, player_size, max_cost=50):
+    # returns (path, cost) like Grid.get_path, the path goes from the goal back to the start
+    if grid.get_cell(start).is_obstacle or grid.get_cell(goal).is_obstacle:
+        return [], -1
+    if start == goal:
+        return [start], 0
+
+    heuristic = movement_heuristic(player_size)
+    forward = PriorityQueue()
+    backward = PriorityQueue()
+    forward.put(start, (heuristic(goal, start), heuristic(goal, start)))
+    backward.put(goal, (heuristic(start, goal), heuristic(start, goal)))
+    # came_from in the forward search, goes_to in the backward one
+    came_from = {start: None}
+    goes_to = {goal: None}
+    forward_cost = {start: 0}
+    backward_cost = {goal: 0}
+
+    # cost of the best path found so far and the cell where both searches met on it
+    best_cost = max_cost
+    meeting = None
+    stats = getattr(grid, 'stats', None)
+
+    while not forward.empty() and not backward.empty():
+        # Every path cheaper than best_cost still runs through an open cell of each search, and
+        # with a consistent heuristic it costs at least the smallest f of either open list.
+        if forward.top_priority()[0] >= best_cost or backward.top_priority()[0] >= best_cost:
+            break
+
+        # grow the smaller search
+        if len(forward) <= len(backward):
+            current = forward.get()
+            steps = grid.get_cell(current).neighbors(player_size)
+            costs, other_costs, parents, open_list, target = forward_cost, backward_cost, came_from, forward, goal
+        else:
+            current = backward.get()
+            steps = predecessors(grid, current, player_size)
+            costs, other_costs, parents, open_list, target = backward_cost, forward_cost, goes_to, backward, start
+        if stats is not None:
+            stats.expand(current)
+
+        current_cost = costs[current]
+        for next_coord in steps:
+            new_cost = current_cost + math.hypot(next_coord[0] - current[0], next_coord[1] - current[1])
+            if new_cost >= max_cost:
+                continue
+            if next_coord not in costs or new_cost < costs[next_coord]:
+                costs[next_coord] = new_cost
+                parents[next_coord] = current
+                estimate = heuristic(target, next_coord)
+                open_list.put(next_coord, (new_cost + estimate, estimate))
+                if stats is not None:
+                    stats.push()
+
+                if next_coord in other_costs and new_cost + other_costs[next_coord] < best_cost:
+                    best_cost = new_cost + other_costs[next_coord]
+                    meeting = next_coord
+
+    if meeting is None:
+        return [], -1
+
+    path = []
+    coord = meeting
+    while coord is not None:
+        path.append(coord)
+        coord = came_from[coord]
+    path.reverse()
+    coord = goes_to[meeting]
+    while coord is not None:
+        path.append(coord)
+        coord = goes_to[coord]
+
+    path.reverse()
+    return path, best_cost
@@ -0,0 +1,343 @@
+# Grid for worlds without edges that only keeps part of the world in memory. The world is cut in
+# chunk_size x chunk_size chunks that are loaded from a ChunkProvider when a cell in them is read,
+# the least recently used chunks are handed back to the provider once memory_budget is used up.
+# Cells are light weight views like DenseGridCell, reading a cell never stores anything per cell.
+#
+# Clearance is computed per chunk when it is first needed, from the chunk and the strips of the
+# chunks right, above and up right of it. Chunks without an obstacle that close keep no clearance.
+
+import math
+import os
+from collections import OrderedDict
+
+from flowField import directions, small_directions
+from grid import Grid, max_player_size
+from mapSnapshot import pack_bits, unpack_bits
+
+chunk_size = 64
+
+# bytes counted for every loaded chunk on top of its buffers
+chunk_overhead = 256
+
+# chunks that are never evicted, a clearance computation holds on to four of them
+min_loaded_chunks = 4
+
+
+class ChunkProvider:
+    # Source of the chunks. load_chunk returns a bytearray with a byte per cell (rows from the
+    # bottom, nonzero for obstacles) or None when the chunk has no obstacles, save_chunk gets the
+    # changed chunks back when they are evicted. This one keeps them in memory packed to one bit
+    # per cell, so a world without a backing store can still be edited.
+    def __init__(self):
+        self._chunks = {}
+
+    def load_chunk(self, chunk_coord, size):
+        bits = self._chunks.get(chunk_coord, None)
+        if bits is None:
+            return None
+        return unpack_bits(bits, size * size)
+
+    def save_chunk(self, chunk_coord, size, obstacles):
+        if obstacles is None or b'\x01' not in obstacles:
+            self._chunks.pop(chunk_coord, None)
+        else:
+            self._chunks[chunk_coord] = pack_bits(obstacles)
+
+
+class DirectoryChunkProvider:
+    # ChunkProvider with a file per chunk holding its obstacle bitset, chunks without a file are empty
+    def __init__(self, path):
+        self.path = path
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+    def _chunk_path(self, chunk_coord):
+        return os.path.join(self.path, '{}_{}.chunk'.format(*chunk_coord))
+
+    def load_chunk(self, chunk_coord, size):
+        try:
+            with open(self._chunk_path(chunk_coord), 'rb') as chunk_file:
+                bits = chunk_file.read()
+        except IOError:
+            return None
+        return unpack_bits(bits, size * size)
+
+    def save_chunk(self, chunk_coord, size, obstacles):
+        chunk_path = self._chunk_path(chunk_coord)
+        if obstacles is None or b'\x01' not in obstacles:
+            if os.path.exists(chunk_path):
+                os.remove(chunk_path)
+            return
+
+        with open(chunk_path, 'wb') as chunk_file:
+            chunk_file.write(pack_bits(obstacles))
+
+
+class Chunk:
+    def __init__(self, obstacles):
+        # byte per cell, None while the chunk has no obstacles
+        self.obstacles = obstacles
+
+        # byte per cell once it is computed, stays None for free chunks
+        self.clearance = None
+
+        # no obstacle is close enough to limit any player size, all cells have max_player_size
+        self.free = False
+
+        # obstacles were set since the chunk was loaded, it has to go back to the provider
+        self.changed = False
+
+    def nbytes(self):
+        return chunk_overhead + len(self.obstacles or b'') + len(self.clearance or b'')
+
+
+class ChunkedGridCell:
+    # Light weight view of a ChunkedGrid cell, these are created on demand and never stored
+    def __init__(self, coordinate, grid):
+        self._grid = grid
+        self._coordinate = coordinate
+
+    @property
+    def coord(self):
+        return self._coordinate
+
+    @property
+    def is_obstacle(self):
+        return self._grid.is_obstacle_at(self._coordinate)
+
+    def neighbors(self, player_size):
+        if self.is_obstacle:
+            return []
+
+        # same order as GridCell.edges and GridCell.small_edges
+        steps = small_directions if player_size == 1 else directions
+        check_square_size = self._grid.check_square_size
+        x_cord, y_cord = self._coordinate
+        return [(x_cord + dx, y_cord + dy) for dx, dy in steps
+                if check_square_size((x_cord + dx, y_cord + dy), player_size)]
+
+    def cost(self, next_cell, max_cost):
+        if self.is_obstacle or next_cell.is_obstacle:
+            return max_cost
+        current_coord = self._coordinate
+        next_coord = next_cell.coord
+        return math.hypot(next_coord[0] - current_coord[0], next_coord[1] - current_coord[1])
+
+    def __eq__(self, other):
+        return isinstance(other, ChunkedGridCell) and self._grid is other._grid and \
+            self._coordinate == other._coordinate
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._coordinate)
+
+
+class ChunkedGrid(Grid):
+    # a component index would have to load the whole world
+    use_components = False
+
+    def __init__(self, provider=None, memory_budget=16 * 1024 * 1024, size=chunk_size):
+        # the dictionaries of cells and clearance Grid makes stay empty, the chunks hold both
+        if size < max_player_size - 1:
+            raise ValueError('chunks have to be at least {} cells wide'.format(max_player_size - 1))
+        Grid.__init__(self)
+
+        self.provider = provider if provider is not None else ChunkProvider()
+        self.chunk_size = size
+        self.memory_budget = memory_budget
+        self.memory_used = 0
+
+        # loaded chunks by chunk coordinate, least recently used first
+        self._chunks = OrderedDict()
+
+        # most reads are in the same chunk as the read before, that one skips the LRU update
+        self._last_chunk_coord = None
+        self._last_chunk = None
+
+    def _locate(self, x_cord, y_cord):
+        # (chunk coordinate, index in the chunk) of a cell
+        size = self.chunk_size
+        return (x_cord // size, y_cord // size), (y_cord % size) * size + x_cord % size
+
+    def _chunk(self, chunk_coord):
+        # the chunk at chunk_coord, loaded if needed and made the most recently used one
+        if chunk_coord == self._last_chunk_coord:
+            return self._last_chunk
+
+        chunk = self._chunks.pop(chunk_coord, None)
+        if chunk is None:
+            chunk = Chunk(self.provider.load_chunk(chunk_coord, self.chunk_size))
+            self.memory_used += chunk.nbytes()
+        self._chunks[chunk_coord] = chunk
+        self._last_chunk_coord = chunk_coord
+        self._last_chunk = chunk
+
+        self._evict()
+        return chunk
+
+    def _evict(self):
+        while self.memory_used > self.memory_budget and len(self._chunks) > min_loaded_chunks:
+            chunk_coord, chunk = self._chunks.popitem(last=False)
+            self.memory_used -= chunk.nbytes()
+            if chunk.changed:
+                self.provider.save_chunk(chunk_coord, self.chunk_size, chunk.obstacles)
+
+    def save_chunks(self):
+        # hands every changed chunk to the provider, they stay loaded
+        for chunk_coord, chunk in self._chunks.items():
+            if chunk.changed:
+                self.provider.save_chunk(chunk_coord, self.chunk_size, chunk.obstacles)
+                chunk.changed = False
+
+    def loaded_chunks(self):
+        return list(self._chunks)
+
+    def get_cell(self, coordinate):
+        return ChunkedGridCell(coordinate, self)
+
+    def is_obstacle_at(self, coord):
+        chunk_coord, index = self._locate(*coord)
+        obstacles = self._chunk(chunk_coord).obstacles
+        return obstacles is not None and obstacles[index] != 0
+
+    def obstacle_coords(self):
+        # obstacles of the loaded chunks
+        size = self.chunk_size
+        coords = []
+        for (x_chunk, y_chunk), chunk in self._chunks.items():
+            if chunk.obstacles is None:
+                continue
+            for index, obstacle in enumerate(chunk.obstacles):
+                if obstacle:
+                    coords.append((x_chunk * size + index % size, y_chunk * size + index // size))
+        return coords
+
+    def snapshot(self):
+        # obstacle_coords only sees the loaded chunks, the provider is where the whole world is kept
+        raise ValueError('a ChunkedGrid is saved through its provider with save_chunks, not a snapshot')
+
+    def _chunk_clearance(self, chunk_coord):
+        chunk = self._chunk(chunk_coord)
+        if chunk.clearance is None and not chunk.free:
+            self._compute_clearance(chunk_coord, chunk)
+        return chunk.clearance
+
+    def _compute_clearance(self, chunk_coord, chunk):
+        # The clearance of a cell only depends on the cells up to max_player_size - 1 right of and
+        # above it, so the chunk is computed as part of a window with those strips of the next
+        # chunks. Cells past the window count as free, that only changes cells outside the chunk.
+        size = self.chunk_size
+        reach = max_player_size - 1
+        window = size + reach
+        x_chunk, y_chunk = chunk_coord
+
+        obstacles = bytearray(window * window)
+        for dx, dy in ((0, 0), (1, 0), (0, 1), (1, 1)):
+            if dx or dy:
+                chunk_obstacles = self._chunk((x_chunk + dx, y_chunk + dy)).obstacles
+            else:
+                chunk_obstacles = chunk.obstacles
+            if chunk_obstacles is None:
+                continue
+            width = reach if dx else size
+            for y_cord in range(reach if dy else size):
+                start = (dy * size + y_cord) * window + dx * size
+                obstacles[start:start + width] = chunk_obstacles[y_cord * size:y_cord * size + width]
+
+        if b'\x01' not in obstacles:
+            chunk.free = True
+            return
+
+        # same pass as DenseGrid._rebuild_clearance
+        clearance = bytearray(size * size)
+        row_above = [max_player_size] * (window + 1)
+        for y_cord in range(window - 1, -1, -1):
+            row = [max_player_size] * (window + 1)
+            row_start = y_cord * window
+            for x_cord in range(window - 1, -1, -1):
+                if obstacles[row_start + x_cord]:
+                    row[x_cord] = 0
+                else:
+                    row[x_cord] = min(1 + min(row[x_cord + 1], row_above[x_cord], row_above[x_cord + 1]),
+                                      max_player_size)
+            if y_cord < size:
+                clearance[y_cord * size:(y_cord + 1) * size] = bytearray(row[:size])
+            row_above = row
+
+        chunk.clearance = clearance
+        self.memory_used += len(clearance)
+
+    def get_clearance(self, coord):
+        chunk_coord, index = self._locate(*coord)
+        clearance = self._chunk_clearance(chunk_coord)
+        if clearance is None:
+            return max_player_size
+        return clearance[index]
+
+    def _set_clearance(self, coord, clearance):
+        chunk_coord, index = self._locate(*coord)
+        if self._chunk_clearance(chunk_coord) is None:
+            if clearance >= max_player_size:
+                return
+            chunk = self._chunk(chunk_coord)
+            chunk.clearance = bytearray([max_player_size]) * (self.chunk_size * self.chunk_size)
+            chunk.free = False
+            self.memory_used += len(chunk.clearance)
+        self._chunk(chunk_coord).clearance[index] = clearance
+
+    def square_test(self, player_size):
+        if player_size > max_player_size:
+            return lambda x, y: self.check_square_size((x, y), player_size)
+
+        get_clearance = self.get_clearance
+        return lambda x, y: get_clearance((x, y)) >= player_size
+
+    def _set_obstacle(self, coord, is_obstacle):
+        chunk_coord, index = self._locate(*coord)
+        chunk = self._chunk(chunk_coord)
+        if chunk.obstacles is None:
+            if not is_obstacle:
+                return
+            chunk.obstacles = bytearray(self.chunk_size * self.chunk_size)
+            self.memory_used += len(chunk.obstacles)
+        chunk.obstacles[index] = 1 if is_obstacle else 0
+        chunk.changed = True
+
+    def set_cell_is_obstacle(self, coord, is_obstacle):
+        self._set_obstacle(coord, is_obstacle)
+        self._update_clearance(coord)
+        self.cache_version += 1
+        self._notify_obstacle_listeners(coord, is_obstacle)
+
+    def set_cells_are_obstacles(self, coords, is_obstacle=True):
+        # set_cell_is_obstacle for many cells, the loaded chunks next to them compute their
+        # clearance again when it is needed
+        changed = [coord for coord in coords if self.is_obstacle_at(coord) != is_obstacle]
+        if not changed:
+            return
+
+        for coord in changed:
+            self._set_obstacle(coord, is_obstacle)
+
+        reach = max_player_size - 1
+        stale = set()
+        for x_cord, y_cord in changed:
+            for x in (x_cord - reach, x_cord):
+                for y in (y_cord - reach, y_cord):
+                    stale.add(self._locate(x, y)[0])
+        for chunk_coord in stale:
+            chunk = self._chunks.get(chunk_coord, None)
+            if chunk is not None:
+                self.memory_used -= len(chunk.clearance or b'')
+                chunk.clearance = None
+                chunk.free = False
+        self.cache_version += 1
+
+        for coord in changed:
+            self._notify_obstacle_listeners(coord, is_obstacle)
+
+    def invalidate_neighbor_cache(self, coord):
+        # cells are not kept, so there are no neighbor caches
+        pass
@@ -0,0 +1,290 @@
+# Connected components of the cells a player of a given size fits in, so a walled off goal is
+# rejected without searching. Removed obstacles merge components with union-find, added ones only
+# relabel the pieces they cut off.
+
+from array import array
+from collections import deque
+
+from mapSnapshot import ComponentLabels
+
+
+class ComponentIndex:
+    def __init__(self, grid, player_size):
+        self._grid = grid
+        self.player_size = player_size
+        if player_size == 1:
+            self._steps = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+        else:
+            self._steps = [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+        # Labels are stored for a box, the whole grid when it has bounds and otherwise all obstacles
+        # grown by more than a player. Cells outside of the box are free and all connected to the
+        # lower left corner of the box. 0 is the label of cells the player does not fit in.
+        self._bounded = grid.bounds() is not None
+        self._origin = (0, 0)
+        self._width = 0
+        self._height = 0
+        self._labels = array('i')
+        self._parent = [0]
+        self._outside = 0
+        self.dirty = True
+
+    def _index(self, coord):
+        x_cord = coord[0] - self._origin[0]
+        y_cord = coord[1] - self._origin[1]
+        if 0 <= x_cord < self._width and 0 <= y_cord < self._height:
+            return y_cord * self._width + x_cord
+        return None
+
+    def _coord(self, index):
+        return self._origin[0] + index % self._width, self._origin[1] + index // self._width
+
+    def _new_label(self):
+        self._parent.append(len(self._parent))
+        return len(self._parent) - 1
+
+    def _find(self, label):
+        parent = self._parent
+        while parent[label] != label:
+            parent[label] = parent[parent[label]]
+            label = parent[label]
+        return label
+
+    def _union(self, first, second):
+        first = self._find(first)
+        second = self._find(second)
+        if first != second:
+            self._parent[second] = first
+
+    def _neighbor_indices(self, index):
+        x_cord, y_cord = self._coord(index)
+        for dx, dy in self._steps:
+            next_index = self._index((x_cord + dx, y_cord + dy))
+            if next_index is not None and self._labels[next_index]:
+                yield next_index
+
+    def rebuild(self):
+        grid = self._grid
+        bounds = grid.bounds()
+        if bounds is None:
+            obstacles = grid.obstacle_coords()
+            if obstacles:
+                margin = self.player_size + 1
+                bounds = (min(coord[0] for coord in obstacles) - margin,
+                          min(coord[1] for coord in obstacles) - margin,
+                          max(coord[0] for coord in obstacles) + margin + 1,
+                          max(coord[1] for coord in obstacles) + margin + 1)
+            else:
+                bounds = (0, 0, 0, 0)
+
+        self._origin = (bounds[0], bounds[1])
+        self._width = bounds[2] - bounds[0]
+        self._height = bounds[3] - bounds[1]
+        labels = array('i', [0]) * (self._width * self._height)
+        self._labels = labels
+        self._parent = [0]
+
+        fits = grid.square_test(self.player_size)
+        visited = bytearray(len(labels))
+        for index in range(len(labels)):
+            if visited[index]:
+                continue
+            visited[index] = 1
+            if not fits(*self._coord(index)):
+                continue
+
+            # flood fill a new component
+            label = self._new_label()
+            labels[index] = label
+            frontier = deque([index])
+            while frontier:
+                x_cord, y_cord = self._coord(frontier.popleft())
+                for dx, dy in self._steps:
+                    next_index = self._index((x_cord + dx, y_cord + dy))
+                    if next_index is None or visited[next_index]:
+                        continue
+                    visited[next_index] = 1
+                    if fits(x_cord + dx, y_cord + dy):
+                        labels[next_index] = label
+                        frontier.append(next_index)
+
+        if not self._bounded:
+            self._outside = labels[0] if labels else self._new_label()
+        self.dirty = False
+
+    def export_labels(self):
+        # ComponentLabels with the components numbered from 1
+        if self.dirty:
+            self.rebuild()
+
+        roots = {0: 0}
+        labels = array('i', [0]) * len(self._labels)
+        for index, label in enumerate(self._labels):
+            root = self._find(label)
+            labels[index] = roots.setdefault(root, len(roots))
+        outside = 0 if self._bounded else roots.setdefault(self._find(self._outside), len(roots))
+        return ComponentLabels(self.player_size, self._origin, self._width, self._height, outside, labels)
+
+    def load_labels(self, components):
+        self._origin = components.origin
+        self._width = components.width
+        self._height = components.height
+        self._labels = components.labels
+        self._outside = components.outside
+        self._parent = list(range(max(max(components.labels or [0]), components.outside) + 1))
+        self.dirty = False
+
+    def component(self, coord):
+        # label of the component of coord, 0 if the player does not fit there
+        if self.dirty:
+            self.rebuild()
+
+        index = self._index(coord)
+        if index is None:
+            return 0 if self._bounded else self._find(self._outside)
+        return self._find(self._labels[index])
+
+    def can_reach(self, start, goal):
+        goal_component = self.component(goal)
+        if not goal_component:
+            return False
+
+        start_component = self.component(start)
+        if start_component:
+            return start_component == goal_component
+
+        # a player that does not fit at the start can still step out of it
+        for next_coord in self._grid.get_cell(start).neighbors(self.player_size):
+            if self.component(next_coord) == goal_component:
+                return True
+        return False
+
+    def obstacle_changed(self, coord, is_obstacle):
+        if self.dirty:
+            return
+
+        # the cells whose square holds coord, plus the ring of cells around them
+        player_size = self.player_size
+        x_coord, y_coord = coord
+        if not self._bounded and (self._index((x_coord - player_size, y_coord - player_size)) is None or
+                                  self._index((x_coord + 1, y_coord + 1)) is None):
+            # the box has to grow
+            self.dirty = True
+            return
+
+        fits = self._grid.square_test(player_size)
+        labels = self._labels
+        changed = []
+        for x in range(x_coord - player_size + 1, x_coord + 1):
+            for y in range(y_coord - player_size + 1, y_coord + 1):
+                index = self._index((x, y))
+                if index is not None and (labels[index] != 0) != fits(x, y):
+                    changed.append(index)
+
+        if not is_obstacle:
+            for index in changed:
+                labels[index] = self._new_label()
+            for index in changed:
+                for next_index in self._neighbor_indices(index):
+                    self._union(labels[index], labels[next_index])
+            return
+
+        for index in changed:
+            labels[index] = 0
+
+        # the cells next to the removed ones may now be in different pieces
+        seeds = {}
+        for index in changed:
+            for next_index in self._neighbor_indices(index):
+                seeds.setdefault(self._find(labels[next_index]), set()).add(next_index)
+        for component_seeds in seeds.values():
+            if len(component_seeds) > 1:
+                self._split(sorted(component_seeds))
+
+        if not self._bounded:
+            self._outside = labels[0]
+
+    def _split(self, seeds):
+        # Grow a search from every seed one cell at a time, searches that meet belong to the same
+        # piece. Once at most one piece still has cells left to visit, the pieces that ran out are
+        # cut off and get new labels. The work stays close to the size of the smaller pieces.
+        owner = {}
+        pieces = list(range(len(seeds)))
+        frontiers = [deque([index]) for index in seeds]
+        visited = [[index] for index in seeds]
+        for number, index in enumerate(seeds):
+            owner[index] = number
+
+        def find_piece(number):
+            while pieces[number] != number:
+                pieces[number] = pieces[pieces[number]]
+                number = pieces[number]
+            return number
+
+        while True:
+            all_pieces = set(find_piece(number) for number in range(len(seeds)))
+            if len(all_pieces) == 1:
+                return
+            growing = set(find_piece(number) for number in range(len(seeds)) if frontiers[number])
+            if len(growing) <= 1:
+                break
+
+            for number, frontier in enumerate(frontiers):
+                if not frontier:
+                    continue
+                for next_index in self._neighbor_indices(frontier.popleft()):
+                    other = owner.get(next_index, None)
+                    if other is None:
+                        owner[next_index] = number
+                        visited[number].append(next_index)
+                        frontier.append(next_index)
+                    else:
+                        pieces[find_piece(other)] = find_piece(number)
+
+        cells = {}
+        for number in range(len(seeds)):
+            cells.setdefault(find_piece(number), []).extend(visited[number])
+        if growing:
+            kept = growing.pop()
+        else:
+            kept = max(cells, key=lambda piece: len(cells[piece]))
+
+        labels = self._labels
+        for piece, piece_cells in cells.items():
+            if piece == kept:
+                continue
+            label = self._new_label()
+            for index in piece_cells:
+                labels[index] = label
+
+
+class ConnectedComponents:
+    # ComponentIndex for every player size that has been asked for, kept up to date with the grid
+    def __init__(self, grid):
+        self._grid = grid
+        self._indices = {}
+
+        grid.add_obstacle_listener(self._obstacle_changed)
+
+    def get_index(self, player_size):
+        index = self._indices.get(player_size, None)
+        if index is None:
+            index = ComponentIndex(self._grid, player_size)
+            self._indices[player_size] = index
+        return index
+
+    def can_reach(self, start, goal, player_size):
+        if start == goal:
+            return True
+        return self.get_index(player_size).can_reach(start, goal)
+
+    def export_labels(self):
+        return [index.export_labels() for _, index in sorted(self._indices.items()) if not index.dirty]
+
+    def load_labels(self, labels):
+        for components in labels:
+            self.get_index(components.player_size).load_labels(components)
+
+    def _obstacle_changed(self, coord, is_obstacle):
+        for index in self._indices.values():
+            index.obstacle_changed(coord, is_obstacle)
@@ -0,0 +1,176 @@
+# Incremental path planner (D* Lite, Koenig & Likhachev) for a unit that keeps heading to the same
+# goal. The search runs backwards from the goal and is kept between calls, an obstacle change only
+# repairs the part of the search it touches and the start may move freely.
+
+import math
+
+from heuristics import movement_heuristic
+from priorityQueue import PriorityQueue
+
+_inf = float('inf')
+
+
+class DStarLite:
+    def __init__(self, grid, start, goal, player_size, max_cost=50):
+        self._grid = grid
+        self.start = start
+        self.goal = goal
+        self.player_size = player_size
+        self.max_cost = max_cost
+        self._heuristic = movement_heuristic(player_size)
+
+        # g is the settled cost to the goal, rhs the one seen from the successors
+        self._g = {}
+        self._rhs = {goal: 0}
+        self._key_modifier = 0
+        self._last_start = start
+        self._changed_areas = []
+
+        self._open = PriorityQueue()
+        self._open.put(goal, self._calculate_key(goal))
+
+        # grid.stats while get_path runs
+        self._stats = None
+
+        grid.add_obstacle_listener(self._obstacle_changed)
+
+    def close(self):
+        # stop listening to the grid, the planner can not be used after this
+        self._grid.remove_obstacle_listener(self._obstacle_changed)
+
+    def move_start(self, start):
+        # keys already in the open list stay valid lower bounds by growing all new ones
+        self._key_modifier += self._heuristic(self._last_start, start)
+        self._last_start = start
+        self.start = start
+
+    def _obstacle_changed(self, coord, is_obstacle):
+        self._changed_areas.append(self._grid.neighbor_influence(coord))
+
+    def _calculate_key(self, coord):
+        cost = min(self._g.get(coord, _inf), self._rhs.get(coord, _inf))
+        return cost + self._heuristic(self.start, coord) + self._key_modifier, cost
+
+    @staticmethod
+    def _step_cost(a, b):
+        return math.hypot(b[0] - a[0], b[1] - a[1])
+
+    def _successors(self, coord):
+        return self._grid.get_cell(coord).neighbors(self.player_size)
+
+    def _predecessors(self, coord):
+        # cells that have coord as one of their neighbors
+        grid = self._grid
+        x_cord, y_cord = coord
+        predecessors = []
+        for x in range(x_cord - 1, x_cord + 2):
+            for y in range(y_cord - 1, y_cord + 2):
+                if (x != x_cord or y != y_cord) and coord in grid.get_cell((x, y)).neighbors(self.player_size):
+                    predecessors.append((x, y))
+        return predecessors
+
+    def _update_vertex(self, coord):
+        if coord != self.goal:
+            g = self._g
+            rhs = _inf
+            for successor in self._successors(coord):
+                cost = self._step_cost(coord, successor) + g.get(successor, _inf)
+                if cost < rhs:
+                    rhs = cost
+            # everything at max_cost or further counts as unreachable, like in Grid.get_path
+            if rhs >= self.max_cost:
+                rhs = _inf
+            if rhs == _inf:
+                self._rhs.pop(coord, None)
+            else:
+                self._rhs[coord] = rhs
+
+        if self._g.get(coord, _inf) != self._rhs.get(coord, _inf):
+            self._open.put(coord, self._calculate_key(coord))
+            if self._stats is not None:
+                self._stats.push()
+        elif coord in self._open:
+            self._open.remove(coord)
+
+    def _apply_changes(self):
+        changed_areas = self._changed_areas
+        self._changed_areas = []
+        updated = set()
+        for x_min, y_min, x_max, y_max in changed_areas:
+            for x in range(x_min, x_max + 1):
+                for y in range(y_min, y_max + 1):
+                    if (x, y) not in updated:
+                        updated.add((x, y))
+                        self._update_vertex((x, y))
+
+    def _compute_shortest_path(self):
+        g = self._g
+        rhs = self._rhs
+        start = self.start
+        open_list = self._open
+        stats = self._stats
+        while not open_list.empty() and (open_list.top_priority() < self._calculate_key(start) or
+                                         rhs.get(start, _inf) != g.get(start, _inf)):
+            old_key = open_list.top_priority()
+            current = open_list.get()
+            if stats is not None:
+                stats.expand(current)
+            new_key = self._calculate_key(current)
+            if old_key < new_key:
+                open_list.put(current, new_key)
+            elif g.get(current, _inf) > rhs.get(current, _inf):
+                g[current] = rhs[current]
+                for predecessor in self._predecessors(current):
+                    self._update_vertex(predecessor)
+            else:
+                g.pop(current, None)
+                self._update_vertex(current)
+                for predecessor in self._predecessors(current):
+                    self._update_vertex(predecessor)
+
+    def get_path(self):
+        # same (path, cost) as Grid.get_path, the path goes from the goal back to the start
+        stats = self._grid.stats
+        if stats is None:
+            return self._get_path()
+
+        stats.begin_query(self.start, self.goal, self.player_size, 'dstar')
+        self._stats = stats
+        path, cost = self._get_path()
+        self._stats = None
+        stats.end_query(cost, 'reconstruct')
+        return path, cost
+
+    def _get_path(self):
+        stats = self._stats
+        if self._changed_areas:
+            self._apply_changes()
+        if stats is not None:
+            stats.lap('repair')
+        self._compute_shortest_path()
+        if stats is not None:
+            stats.lap('search')
+
+        cost = self._rhs.get(self.start, _inf)
+        grid = self._grid
+        if cost == _inf or grid.get_cell(self.start).is_obstacle or grid.get_cell(self.goal).is_obstacle:
+            return [], -1
+
+        g = self._g
+        path = [self.start]
+        current = self.start
+        while current != self.goal:
+            best = None
+            best_cost = _inf
+            for successor in self._successors(current):
+                successor_cost = self._step_cost(current, successor) + g.get(successor, _inf)
+                if successor_cost < best_cost:
+                    best = successor
+                    best_cost = successor_cost
+            if best is None or len(path) > len(g):
+                return [], -1
+            path.append(best)
+            current = best
+
+        path.reverse()
+        return path, cost
@@ -1,3 +1,33 @@
-# debug console
-# debug grid
 # debug drawing
+
+from cocos.draw import Canvas
+
+
+class HeatmapCanvas(Canvas):
+    # Colors every cell by how often the searches expanded it, from yellow for the cells expanded
+    # least to red for the ones expanded most. Takes the heatmap of a searchStats.SearchStats.
+    def __init__(self, grid_cell_size, alpha=96):
+        super(HeatmapCanvas, self).__init__()
+        self._grid_cell_size = grid_cell_size
+        self._alpha = alpha
+        self._heatmap = {}
+
+    def set_heatmap(self, heatmap):
+        self._heatmap = dict(heatmap or {})
+        self.free()
+
+    def render(self):
+        heatmap = self._heatmap
+        if len(heatmap) == 0:
+            return
+
+        size = self._grid_cell_size
+        highest = max(heatmap.values())
+        # a line as wide as a cell fills it
+        self.set_stroke_width(size)
+        for (x_cord, y_cord), count in heatmap.items():
+            heat = count / float(highest)
+            self.set_color((255, int(255 * (1 - heat)), 0, self._alpha))
+            y_pos = y_cord * size + size / 2.0
+            self.move_to((x_cord * size, y_pos))
+            self.line_to(((x_cord + 1) * size, y_pos))
@@ -1,28 +1,58 @@
 import heapq
 import math
+from array import array
 
-max_player_size = 10
-
-
-class PriorityQueue:
-    def __init__(self):
-        self.elements = []
-
-    def empty(self):
-        return len(self.elements) == 0
+from anyAngle import theta_star_search
+from bidirectionalSearch import bidirectional_search
+from flowField import FlowFieldCache
+from heuristics import movement_heuristic
+from mapSnapshot import DISTANCE_GRID, Snapshot, read_snapshot, write_snapshot
+from pathBuffer import PathBuffer, new_path
+from priorityQueue import PriorityQueue
 
-    def put(self, item, priority):
-        heapq.heappush(self.elements, (priority, item))
+max_player_size = 10
 
-    def get(self):
-        return heapq.heappop(self.elements)[1]
+# stands in for "no obstacle" in the squared distance transform
+_far = 1e20
+
+
+def squared_distance_transform_1d(f):
+    # Felzenszwalb & Huttenlocher lower envelope of parabolas, returns for every q
+    # min over p of (q - p)^2 + f[p] in linear time together with the p it came from
+    n = len(f)
+    distances = [0.0] * n
+    sources = [0] * n
+    parabolas = [0] * n
+    bounds = [0.0] * (n + 1)
+    k = 0
+    bounds[0] = -float('inf')
+    bounds[1] = float('inf')
+    for q in range(1, n):
+        p = parabolas[k]
+        s = ((f[q] + q * q) - (f[p] + p * p)) / (2.0 * (q - p))
+        while s <= bounds[k]:
+            k -= 1
+            p = parabolas[k]
+            s = ((f[q] + q * q) - (f[p] + p * p)) / (2.0 * (q - p))
+        k += 1
+        parabolas[k] = q
+        bounds[k] = s
+        bounds[k + 1] = float('inf')
+
+    k = 0
+    for q in range(n):
+        while bounds[k + 1] < q:
+            k += 1
+        p = parabolas[k]
+        distances[q] = (q - p) * (q - p) + f[p]
+        sources[q] = p
+    return distances, sources
 
 
 class DistanceGridCell:
     def __init__(self, coordinate, grid):
         self._grid = grid
 
-        self.cache_version = -1
         self._coordinate = coordinate
         x_cord, y_cord = coordinate
 
@@ -57,50 +87,10 @@ class DistanceGridCell:
     def coord(self):
         return self._coordinate
 
-    def update_wall_dist(self, player_size):
-        if self.wall_dist == 0:
-            return
-
-        if self.cache_version != self._grid.cache_version:
-            self.cache_version = self._grid.cache_version
-            grid = self._grid
-            xc, yc = self.coord
-            best_dist = player_size + 1
-            for x in range(0, player_size):
-                for y in range(0, player_size):
-                    if x == 0 and y == 0:
-                        continue
-
-                    if x > 0 and y > 0:
-                        cells = [
-                            grid.get_cell((xc + x, yc + y)),
-                            grid.get_cell((xc + x, yc - y)),
-                            grid.get_cell((xc - x, yc - y)),
-                            grid.get_cell((xc - x, yc + y)),
-                        ]
-                    elif x > 0:
-                        cells = [
-                            grid.get_cell((xc + x, yc)),
-                            grid.get_cell((xc - x, yc)),
-                        ]
-                    else:
-                        cells = [
-                            grid.get_cell((xc, yc + y)),
-                            grid.get_cell((xc, yc - y)),
-                        ]
-
-                    for cell in cells:
-                        if cell.wall_dist == 0:
-                            dist = cell.distance(self)
-                            if dist < best_dist:
-                                best_dist = dist
-
-            self.wall_dist = best_dist
-
     def neighbors(self, player_size):
-        self.update_wall_dist(player_size)
-
-        if self.wall_dist < player_size / 2.0:
+        grid = self._grid
+        half_size = player_size / 2.0
+        if self.wall_dist == 0 or grid.wall_distance(self.coord) < half_size:
             return []
 
         if player_size == 1:
@@ -108,12 +98,9 @@ class DistanceGridCell:
         else:
             edges = self.edges
 
-        grid = self._grid
         with_obstacles = []
         for offset, edge in edges:
-            edge_cell = grid.get_cell(edge)
-            edge_cell.update_wall_dist(player_size)
-            if edge_cell.wall_dist > player_size / 2.0:
+            if grid.wall_distance(edge) > half_size:
                 with_obstacles.append(edge)
 
         return with_obstacles
@@ -132,7 +119,29 @@ class DistanceGridCell:
 class DistanceGrid:
     def __init__(self):
         self._grid = {}
-        self.cache_version = 0
+
+        # Exact euclidean distance to the closest obstacle, stored squared for the bounding box of
+        # all obstacles grown by max_player_size. Everything outside of it is further away than
+        # any player size cares about.
+        self._obstacles = set()
+        self._field = array('d')
+        self._field_origin = (0, 0)
+        self._field_size = (0, 0)
+        self._field_dirty = False
+
+        # Closest obstacle (as a field index) of every field cell, -1 when it has none. Obstacle
+        # changes inside the box are propagated from here as raise and lower waves.
+        self._nearest = array('i')
+        self._to_raise = bytearray()
+        self._open = []
+
+        # called with (coord, is_obstacle) after every obstacle change
+        self._obstacle_listeners = []
+
+        self._flow_fields = None
+
+        # searchStats.SearchStats that records every get_path query, None records nothing
+        self.stats = None
 
     def get_cell(self, coordinate):
         cell = self._grid.get(coordinate, None)
@@ -142,19 +151,19 @@ class DistanceGrid:
         return cell
 
     @staticmethod
-    def heuristic(a, b):
-        (x1, y1) = a.coord
-        (x2, y2) = b.coord
-        return abs(x1 - x2) + abs(y1 - y2)
+    def heuristic(a, b, player_size=1):
+        return movement_heuristic(player_size)(a.coord, b.coord)
 
-    def reconstruct_path(self, came_from, start, goal, reversed_path=True):
+    def reconstruct_path(self, came_from, start, goal, reversed_path=True, compact=False):
+        # compact builds a PathBuffer instead of a list of tuples
         current = self.get_cell(goal)
-        path = [current.coord]
+        path = new_path(compact)
+        path.append(current.coord)
         start_cell = self.get_cell(start)
         while current != start_cell:
             current = came_from.get(current, None)
             if current is None:
-                return []
+                return new_path(compact)
             path.append(current.coord)
 
         if not reversed_path:
@@ -166,7 +175,7 @@ class DistanceGrid:
         frontier = PriorityQueue()
         start_cell = self.get_cell(start)
         goal_cell = self.get_cell(goal)
-        frontier.put(start_cell, 0)
+        frontier.put(start_cell, (0, 0))
         came_from = {}
         cost_so_far = {start_cell: 0}
         came_from[start_cell] = None
@@ -174,12 +183,21 @@ class DistanceGrid:
         if start_cell.cost(goal_cell, max_cost) >= max_cost:
             return {}, {}
 
+        heuristic = movement_heuristic(player_size)
+        goal_coord = goal_cell.coord
+        stats = self.stats
+        edge_count = len(goal_cell.small_edges if player_size == 1 else goal_cell.edges)
         while not frontier.empty():
             current = frontier.get()
+            if stats is not None:
+                stats.expand(current.coord)
 
             if current == goal_cell:
                 break
 
+            if stats is not None:
+                # the cell itself and every edge are checked against the distance field
+                stats.current.square_checks += 1 + edge_count
             for next_cell_coord in current.neighbors(player_size):
                 next_cell = self.get_cell(next_cell_coord)
                 new_cost = cost_so_far[current] + current.cost(next_cell, max_cost)
@@ -187,40 +205,295 @@ class DistanceGrid:
                     continue
                 if next_cell not in cost_so_far or new_cost < cost_so_far[next_cell]:
                     cost_so_far[next_cell] = new_cost
-                    priority = new_cost + self.heuristic(goal_cell, next_cell)
-                    frontier.put(next_cell, priority)
+                    # on equal cost prefer the cell closer to the goal
+                    estimate = heuristic(goal_coord, next_cell_coord)
+                    frontier.put(next_cell, (new_cost + estimate, estimate))
                     came_from[next_cell] = current
+                    if stats is not None:
+                        stats.push()
 
         return came_from, cost_so_far
 
-    def get_path(self, start, goal, player_size, max_cost=50):
+    def get_path(self, start, goal, player_size, max_cost=50, algorithm='astar', compact=False):
+        # compact returns the path as a PathBuffer instead of a list of tuples
+        stats = self.stats
+        if stats is None:
+            return self._search_path(start, goal, player_size, max_cost, algorithm, compact)
+
+        stats.begin_query(start, goal, player_size, algorithm)
+        path, cost = self._search_path(start, goal, player_size, max_cost, algorithm, compact)
+        stats.end_query(cost, 'search')
+        return path, cost
+
+    def _search_path(self, start, goal, player_size, max_cost, algorithm, compact=False):
+        stats = self.stats
+        # Bidirectional A* (a full cell path) and Theta* (only the turning points) return their
+        # path themselves instead of a came_from map, it only needs converting to a buffer
+        if algorithm in ('bidirectional', 'theta'):
+            search = bidirectional_search if algorithm == 'bidirectional' else theta_star_search
+            path, cost = search(self, start, goal, player_size, max_cost)
+            return (PathBuffer.from_path(path) if compact else path), cost
+
         came_from, cost = self.a_star_search(
             start=start,
             goal=goal,
             player_size=player_size,
             max_cost=max_cost
         )
+        if stats is not None:
+            stats.lap('search')
 
         if len(came_from) == 0:
-            return [], -1
+            return new_path(compact), -1
 
         path = self.reconstruct_path(
             came_from=came_from,
             start=start,
             goal=goal,
-            reversed_path=True
+            reversed_path=True,
+            compact=compact
         )
+        if stats is not None:
+            stats.lap('reconstruct')
 
         return path, cost.get(self.get_cell(goal), 0)
 
+    def get_flow_field(self, goals, player_size, max_cost=50):
+        # FlowField towards the closest of goals, kept until an obstacle change affects it
+        if self._flow_fields is None:
+            self._flow_fields = FlowFieldCache(self)
+        return self._flow_fields.get(goals, player_size, max_cost)
+
     def set_cell_is_obstacle(self, coord, is_obstacle):
+        if (coord in self._obstacles) == is_obstacle:
+            return
+
         if is_obstacle:
             self.get_cell(coord).wall_dist = 0
+            self._obstacles.add(coord)
         else:
             self.get_cell(coord).wall_dist = -1
-        self.cache_version += 1
+            self._obstacles.discard(coord)
+
+        self._queue_field_update(coord, is_obstacle)
+        for listener in self._obstacle_listeners:
+            listener(coord, is_obstacle)
+
+    def set_cells_are_obstacles(self, coords, is_obstacle=True):
+        # set_cell_is_obstacle for many cells, the distance field is rebuilt once when it is needed
+        changed = [coord for coord in coords if (coord in self._obstacles) != is_obstacle]
+        if not changed:
+            return
+
+        for coord in changed:
+            if is_obstacle:
+                self.get_cell(coord).wall_dist = 0
+                self._obstacles.add(coord)
+            else:
+                self.get_cell(coord).wall_dist = -1
+                self._obstacles.discard(coord)
+        self._field_dirty = True
+
+        for coord in changed:
+            for listener in self._obstacle_listeners:
+                listener(coord, is_obstacle)
+
+    def obstacle_coords(self):
+        return list(self._obstacles)
+
+    def add_obstacle_listener(self, listener):
+        self._obstacle_listeners.append(listener)
+
+    def remove_obstacle_listener(self, listener):
+        self._obstacle_listeners.remove(listener)
+
+    @staticmethod
+    def neighbor_influence(coord):
+        # Box (x_min, y_min, x_max, y_max) of the cells whose neighbors can change with coord. Only
+        # wall distances up to max_player_size / 2 decide anything, plus one for the edges.
+        x_coord, y_coord = coord
+        reach = max_player_size // 2 + 1
+        return x_coord - reach, y_coord - reach, x_coord + reach, y_coord + reach
+
+    def _queue_field_update(self, coord, is_obstacle):
+        if self._field_dirty:
+            return
+
+        x_origin, y_origin = self._field_origin
+        width, height = self._field_size
+        x_cord = coord[0] - x_origin
+        y_cord = coord[1] - y_origin
+        if is_obstacle and not (max_player_size <= x_cord < width - max_player_size and
+                                max_player_size <= y_cord < height - max_player_size):
+            # the box has to grow
+            self._field_dirty = True
+            return
+
+        index = y_cord * width + x_cord
+        if is_obstacle:
+            self._nearest[index] = index
+            self._field[index] = 0.0
+        else:
+            self._nearest[index] = -1
+            self._field[index] = _far
+            self._to_raise[index] = 1
+        heapq.heappush(self._open, (0.0, index))
+
+    def wall_distance(self, coord):
+        if self._field_dirty:
+            self.rebuild_distance_field()
+        elif self._open:
+            self._update_distance_field()
+
+        x_origin, y_origin = self._field_origin
+        width, height = self._field_size
+        x_cord = coord[0] - x_origin
+        y_cord = coord[1] - y_origin
+        if 0 <= x_cord < width and 0 <= y_cord < height:
+            distance = self._field[y_cord * width + x_cord]
+            if distance < _far:
+                return math.sqrt(distance)
+        return float(max_player_size + 1)
+
+    def square_test(self, player_size):
+        # fits(x, y) is True where a player can step onto the cell
+        half_size = player_size / 2.0
+        return lambda x, y: self.wall_distance((x, y)) > half_size
+
+    def _field_neighbors(self, index):
+        width, height = self._field_size
+        x_cord = index % width
+        y_cord = index // width
+        for y in range(max(y_cord - 1, 0), min(y_cord + 2, height)):
+            for x in range(max(x_cord - 1, 0), min(x_cord + 2, width)):
+                if x != x_cord or y != y_cord:
+                    yield y * width + x
+
+    def _update_distance_field(self):
+        # Dynamic brushfire (Lau, Sprunk & Burgard): a raise wave clears every cell whose closest
+        # obstacle was removed, the lower wave then refills them and spreads new obstacles. Only
+        # cells whose closest obstacle actually changes are visited.
+        field = self._field
+        nearest = self._nearest
+        to_raise = self._to_raise
+        open_cells = self._open
+        width = self._field_size[0]
+        while open_cells:
+            _, index = heapq.heappop(open_cells)
+            if to_raise[index]:
+                for neighbor in self._field_neighbors(index):
+                    obstacle = nearest[neighbor]
+                    if obstacle != -1 and not to_raise[neighbor]:
+                        heapq.heappush(open_cells, (field[neighbor], neighbor))
+                        if nearest[obstacle] != obstacle:
+                            field[neighbor] = _far
+                            nearest[neighbor] = -1
+                            to_raise[neighbor] = 1
+                to_raise[index] = 0
+
+            obstacle = nearest[index]
+            if obstacle == -1 or nearest[obstacle] != obstacle:
+                continue
+
+            x_obstacle = obstacle % width
+            y_obstacle = obstacle // width
+            for neighbor in self._field_neighbors(index):
+                if not to_raise[neighbor]:
+                    dx = neighbor % width - x_obstacle
+                    dy = neighbor // width - y_obstacle
+                    distance = dx * dx + dy * dy
+                    if distance < field[neighbor]:
+                        field[neighbor] = distance
+                        nearest[neighbor] = obstacle
+                        heapq.heappush(open_cells, (distance, neighbor))
+
+    def rebuild_distance_field(self):
+        # Exact euclidean distance transform, one pass over the columns and one over the rows,
+        # linear in the number of cells in the box.
+        self._field_dirty = False
+        self._open = []
+        if not self._obstacles:
+            self._field = array('d')
+            self._nearest = array('i')
+            self._to_raise = bytearray()
+            self._field_size = (0, 0)
+            return
 
-    def update_player_size(self):
-        self.cache_version += 1
+        x_origin = min(x for x, _ in self._obstacles) - max_player_size
+        y_origin = min(y for _, y in self._obstacles) - max_player_size
+        width = max(x for x, _ in self._obstacles) - x_origin + max_player_size + 1
+        height = max(y for _, y in self._obstacles) - y_origin + max_player_size + 1
+
+        field = array('d', [_far]) * (width * height)
+        for x_cord, y_cord in self._obstacles:
+            field[(y_cord - y_origin) * width + x_cord - x_origin] = 0.0
+
+        # row of the closest obstacle in the same column
+        source_rows = [0] * (width * height)
+        for x_cord in range(width):
+            column, rows = squared_distance_transform_1d(field[x_cord::width])
+            for y_cord in range(height):
+                field[y_cord * width + x_cord] = column[y_cord]
+                source_rows[y_cord * width + x_cord] = rows[y_cord]
+
+        nearest = array('i', [-1]) * (width * height)
+        for y_cord in range(height):
+            row_start = y_cord * width
+            row, columns = squared_distance_transform_1d(field[row_start:row_start + width])
+            field[row_start:row_start + width] = array('d', row)
+            for x_cord in range(width):
+                source_column = columns[x_cord]
+                nearest[row_start + x_cord] = source_rows[row_start + source_column] * width + source_column
+
+        self._field = field
+        self._nearest = nearest
+        self._to_raise = bytearray(width * height)
+        self._field_origin = (x_origin, y_origin)
+        self._field_size = (width, height)
+
+    def snapshot(self):
+        # Snapshot of the obstacles together with the distance field, which is brought up to date first
+        if self._field_dirty:
+            self.rebuild_distance_field()
+        elif self._open:
+            self._update_distance_field()
+
+        x_origin, y_origin = self._field_origin
+        width, height = self._field_size
+        obstacles = bytearray(width * height)
+        for x_cord, y_cord in self._obstacles:
+            obstacles[(y_cord - y_origin) * width + x_cord - x_origin] = 1
+
+        snapshot = Snapshot(DISTANCE_GRID, self._field_origin, width, height, obstacles)
+        snapshot.distance_box = (x_origin, y_origin, width, height)
+        snapshot.distance_field = self._field
+        snapshot.nearest = self._nearest
+        return snapshot
+
+    def save_snapshot(self, path):
+        write_snapshot(path, self.snapshot())
+
+    @classmethod
+    def load_snapshot(cls, path):
+        return cls.from_snapshot(read_snapshot(path))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        grid = cls()
+        for coord in snapshot.obstacle_coords():
+            grid.get_cell(coord).wall_dist = 0
+            grid._obstacles.add(coord)
+
+        if snapshot.distance_field is None:
+            grid._field_dirty = bool(grid._obstacles)
+            return grid
+
+        x_origin, y_origin, width, height = snapshot.distance_box
+        grid._field = snapshot.distance_field
+        grid._nearest = snapshot.nearest
+        grid._to_raise = bytearray(width * height)
+        grid._field_origin = (x_origin, y_origin)
+        grid._field_size = (width, height)
+        return grid
 
 
@@ -130,8 +130,6 @@ class GridLayer(cocos.layer.Layer):
             self.start_square = None
             self.set_start_pos(start_pos)
 
-        self._grid.update_player_size()
-
     def update_state(self, state):
         if state == 'path':
             self.path_canvas.scale = 1
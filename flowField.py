@@ -0,0 +1,188 @@
+# Flow fields (Dijkstra maps) for many units heading to the same goal. One search from the goals
+# gives every reachable cell around them its cost and the step to take, after that a unit finds
+# its path by following the steps without searching.
+
+import math
+from array import array
+from collections import OrderedDict
+
+from heuristics import diagonal_cost
+from priorityQueue import PriorityQueue
+
+# steps stored in FlowField.directions, 0 means no step
+directions = [(0, 1), (1, 1), (1, 0), (1, -1), (0, -1), (-1, -1), (-1, 0), (-1, 1)]
+small_directions = [(0, 1), (0, -1), (1, 0), (-1, 0)]
+
+# fields kept by a FlowFieldCache before the oldest one is dropped
+max_flow_fields = 16
+
+
+class FlowField:
+    def __init__(self, grid, goals, player_size, max_cost=50, bounds=None):
+        # The field covers the goals grown by max_cost, clipped to bounds (x_min, y_min, x_max,
+        # y_max) for grids that have an edge. Cells further away can not be reached anyway.
+        self.goals = list(goals)
+        self.player_size = player_size
+        self.max_cost = max_cost
+
+        reach = int(math.ceil(max_cost)) if max_cost != float('inf') else None
+        if reach is None and bounds is None:
+            raise ValueError('a flow field on an unbounded grid needs a finite max_cost')
+
+        x_min = min(goal[0] for goal in self.goals)
+        y_min = min(goal[1] for goal in self.goals)
+        x_max = max(goal[0] for goal in self.goals) + 1
+        y_max = max(goal[1] for goal in self.goals) + 1
+        if reach is not None:
+            x_min, y_min, x_max, y_max = x_min - reach, y_min - reach, x_max + reach, y_max + reach
+        if bounds is not None:
+            x_min = max(x_min, bounds[0])
+            y_min = max(y_min, bounds[1])
+            x_max = min(x_max, bounds[2])
+            y_max = min(y_max, bounds[3])
+        self.origin = (x_min, y_min)
+        self.width = max(x_max - x_min, 0)
+        self.height = max(y_max - y_min, 0)
+
+        # cost to the closest goal, -1 for cells that can not reach one
+        self.costs = array('d', [-1.0]) * (self.width * self.height)
+        # 1 + index in directions of the step towards the goal
+        self.directions = bytearray(self.width * self.height)
+
+        self._build(grid)
+
+    def index(self, coord):
+        x_cord = coord[0] - self.origin[0]
+        y_cord = coord[1] - self.origin[1]
+        if 0 <= x_cord < self.width and 0 <= y_cord < self.height:
+            return y_cord * self.width + x_cord
+        return None
+
+    def coord(self, index):
+        return self.origin[0] + index % self.width, self.origin[1] + index // self.width
+
+    def _build(self, grid):
+        # Dijkstra backwards from all goals at once. A cell is reached from the cell it can step
+        # to, so the moves are checked from the side of the cell that takes them.
+        player_size = self.player_size
+        max_cost = self.max_cost
+        costs = self.costs
+        steps = small_directions if player_size == 1 else directions
+        moves = {}
+        stats = getattr(grid, 'stats', None)
+
+        frontier = PriorityQueue()
+        for goal in self.goals:
+            index = self.index(goal)
+            if index is not None and not grid.get_cell(goal).is_obstacle:
+                costs[index] = 0.0
+                frontier.put(index, 0.0)
+
+        while not frontier.empty():
+            current = frontier.get()
+            current_coord = self.coord(current)
+            current_cost = costs[current]
+            if stats is not None:
+                stats.expand(current_coord)
+
+            for dx, dy in steps:
+                previous_coord = (current_coord[0] - dx, current_coord[1] - dy)
+                previous = self.index(previous_coord)
+                if previous is None:
+                    continue
+
+                step_cost = diagonal_cost if dx and dy else 1.0
+                new_cost = current_cost + step_cost
+                if new_cost >= max_cost:
+                    continue
+                if 0 <= costs[previous] <= new_cost:
+                    continue
+
+                previous_moves = moves.get(previous, None)
+                if previous_moves is None:
+                    previous_moves = set(grid.get_cell(previous_coord).neighbors(player_size))
+                    moves[previous] = previous_moves
+                if current_coord not in previous_moves:
+                    continue
+
+                costs[previous] = new_cost
+                self.directions[previous] = directions.index((dx, dy)) + 1
+                frontier.put(previous, new_cost)
+                if stats is not None:
+                    stats.push()
+
+    def get_cost(self, coord):
+        index = self.index(coord)
+        if index is None:
+            return -1
+        return self.costs[index]
+
+    def next_step(self, coord):
+        index = self.index(coord)
+        if index is None or not self.directions[index]:
+            return None
+        dx, dy = directions[self.directions[index] - 1]
+        return coord[0] + dx, coord[1] + dy
+
+    def get_path(self, start):
+        # same (path, cost) as Grid.get_path, the path goes from the goal back to start
+        cost = self.get_cost(start)
+        if cost < 0:
+            return [], -1
+
+        path = [start]
+        coord = self.next_step(start)
+        while coord is not None:
+            path.append(coord)
+            coord = self.next_step(coord)
+
+        path.reverse()
+        return path, cost
+
+    def is_affected_by(self, area):
+        # True if a change to the neighbors of the cells in area (x_min, y_min, x_max, y_max) can
+        # change the field. Only moves into reached cells are used, so an area one cell away from
+        # every reached cell changes nothing.
+        x_min = max(area[0] - 1 - self.origin[0], 0)
+        y_min = max(area[1] - 1 - self.origin[1], 0)
+        x_max = min(area[2] + 1 - self.origin[0], self.width - 1)
+        y_max = min(area[3] + 1 - self.origin[1], self.height - 1)
+        costs = self.costs
+        for y in range(y_min, y_max + 1):
+            row = y * self.width
+            for x in range(x_min, x_max + 1):
+                if costs[row + x] >= 0:
+                    return True
+        return False
+
+
+class FlowFieldCache:
+    # Flow fields by (goals, player_size, max_cost), dropped when an obstacle change affects them
+    def __init__(self, grid, bounds=None):
+        self._grid = grid
+        self._bounds = bounds
+        self._fields = OrderedDict()
+
+        grid.add_obstacle_listener(self._obstacle_changed)
+
+    def get(self, goals, player_size, max_cost=50):
+        key = (tuple(sorted(goals)), player_size, max_cost)
+        field = self._fields.pop(key, None)
+        if field is None:
+            # every field that is built counts as one query without a start
+            stats = getattr(self._grid, 'stats', None)
+            if stats is not None:
+                stats.begin_query(None, key[0], player_size, 'flow')
+            field = FlowField(self._grid, goals, player_size, max_cost, self._bounds)
+            if stats is not None:
+                stats.end_query(None, 'search')
+            if len(self._fields) >= max_flow_fields:
+                self._fields.popitem(last=False)
+        self._fields[key] = field
+        return field
+
+    def _obstacle_changed(self, coord, is_obstacle):
+        area = self._grid.neighbor_influence(coord)
+        for key, field in list(self._fields.items()):
+            if field.is_affected_by(area):
+                del self._fields[key]
@@ -1,4 +1,5 @@
 import os
+import sys
 from collections import defaultdict
 
 import cocos
@@ -6,6 +7,11 @@ import pyglet
 from cocos.draw import Canvas
 from cocos.euclid import Point2
 
+# the repository root, so the script runs from any directory
+g_root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, g_root_dir)
+from mapLoader import color_masks, mask_coords
+
 # THINGS to tweak to get different effects
 g_should_trace_walls = True  # If this is False we don't trace against walls for line of sight. Meaning you will see everything withing a radius.
 g_fog_neighbour_radius = 1  # This is the radius that fog is uncovered from visible slots.
@@ -39,7 +45,7 @@ class PlayerNode(cocos.cocosnode.CocosNode):
     def __init__(self, player_type):
         super(PlayerNode, self).__init__()
 
-        player_path = os.path.abspath('../assets/circle.png')
+        player_path = os.path.abspath(os.path.join(g_root_dir, 'assets', 'circle.png'))
         player_img = pyglet.image.load(player_path)
         player = cocos.sprite.Sprite(
             image=player_img,
@@ -266,7 +272,7 @@ class GameLayer(cocos.layer.Layer):
         # Update camera
         self.update_camera()
 
-        bg_path = os.path.abspath("../assets/grid.png")
+        bg_path = os.path.abspath(os.path.join(g_root_dir, "assets", "grid.png"))
         bg_img = pyglet.image.load(bg_path)
         bg = cocos.sprite.Sprite(bg_img, anchor=(0, 0))
         # self.add(bg)
@@ -275,13 +281,16 @@ class GameLayer(cocos.layer.Layer):
         # bg_texture_data = bg.image.get_image_data()
 
         full_cover_colors = [[145, 145, 145]]
-        self.do_something_from_colors(full_cover_colors, bg, self.add_full_cover)
-
         half_cover_colors = [[133, 175, 133]]
-        self.do_something_from_colors(half_cover_colors, bg, self.add_half_cover)
-
         enemy_colors = [[255, 0, 0]]
-        self.do_something_from_colors(enemy_colors, bg, self.add_enemy)
+
+        # sample the image once for all three layers
+        data = bg.image.get_image_data().get_data('RGB', bg.width * 3)
+        columns, rows, masks = color_masks(data, bg.width, bg.height, g_grid_size,
+                                           [full_cover_colors, half_cover_colors, enemy_colors])
+        for layer, mask in zip((self.full_cover, self.half_cover, self.enemies), masks):
+            for grid_pos in mask_coords(mask, columns):
+                layer.set_grid_pos_visible(grid_pos, True)
 
         self.add(self.full_cover)
         self.add(self.half_cover)
@@ -295,35 +304,6 @@ class GameLayer(cocos.layer.Layer):
         self.half_cover.update_grid()
         self.enemies.update_grid()
 
-    def add_full_cover(self, position):
-        self.full_cover.set_grid_pos_visible(world_to_grid(position), True)
-
-    def add_half_cover(self, position):
-        self.half_cover.set_grid_pos_visible(world_to_grid(position), True)
-
-    def add_enemy(self, position):
-        self.enemies.set_grid_pos_visible(world_to_grid(position), True)
-
-    @staticmethod
-    def do_something_from_colors(colors, sprite, callback):
-        bg_texture_data = sprite.image.get_image_data()
-        data = bg_texture_data.get_data('RGB', sprite.width * 3)
-        for x in xrange(g_grid_size / 2, sprite.width, g_grid_size):
-            for y in xrange(g_grid_size / 2, sprite.height, g_grid_size):
-                pos = (sprite.width * y + x) * 3
-                rgb = map(ord, data[pos:pos + 3])
-                valid = False
-                limit = 2
-                for valid_color in colors:
-                    if valid:
-                        break
-                    valid = True
-                    for i in xrange(0, 3):
-                        valid = valid and abs(valid_color[i] - rgb[i]) < limit
-
-                if valid:
-                    callback(position=(x, y))
-
     def on_key_press(self, key, modifiers):
         self.keys_pressed.add(key)
 
@@ -4,22 +4,25 @@
 # can be used to show field of view as well.
 
 
-import heapq
 import math
 
+from anyAngle import theta_star_search
+from bidirectionalSearch import bidirectional_search
+from connectedComponents import ConnectedComponents
+from flowField import FlowFieldCache
+from heuristics import diagonal_cost, movement_heuristic, octile_distance
+from mapSnapshot import DENSE_GRID, GRID, Snapshot, read_snapshot, write_snapshot
+from pathBuffer import PathBuffer, new_path
+from pathCache import PathCache
+from priorityQueue import PriorityQueue
 
-class PriorityQueue:
-    def __init__(self):
-        self.elements = []
-
-    def empty(self):
-        return len(self.elements) == 0
+max_player_size = 10
 
-    def put(self, item, priority):
-        heapq.heappush(self.elements, (priority, item))
+# cells a jump scans before it stops at a plain cell, see Grid._jump
+max_jump_length = 8
 
-    def get(self):
-        return heapq.heappop(self.elements)[1]
+# positions of GridCell.small_edges in GridCell.edges
+small_edge_numbers = (0, 4, 2, 6)
 
 
 class GridCell:
@@ -27,6 +30,9 @@ class GridCell:
         self._grid = grid
         self.cache_version = -1
 
+        # Clearance of the cell at the end of every edge, the largest player size that can take
+        # it. The neighbors of every player size up to max_player_size come from this one list.
+        self.edge_clearance = None
         self.neighbor_cache = {}
 
         # by default we are not an obstacle
@@ -62,29 +68,38 @@ class GridCell:
         if self.is_obstacle:
             return []
 
-        cache = self.neighbor_cache.get((self.coord, player_size), None)
-        if cache is not None and self._grid.cache_version == self.cache_version:
+        grid = self._grid
+        if self.cache_version != grid.cache_version:
+            self.edge_clearance = None
+            self.neighbor_cache = {}
+            self.cache_version = grid.cache_version
+
+        stats = grid.stats
+        if stats is not None:
+            stats.current.neighbor_lookups += 1
+
+        cache = self.neighbor_cache.get(player_size, None)
+        if cache is not None:
             return cache
 
-        edges = []
-        if player_size == 1:
-            edges = self.small_edges
+        if stats is not None:
+            stats.current.neighbor_cache_misses += 1
+            if player_size > max_player_size or self.edge_clearance is None:
+                stats.current.square_checks += len(self.edges)
+
+        if player_size > max_player_size:
+            with_size = [edge for edge in self.edges if grid.check_square_size(edge, player_size)]
         else:
-            edges = self.edges
+            if self.edge_clearance is None:
+                self.edge_clearance = [grid.get_clearance(edge) for edge in self.edges]
+            if player_size == 1:
+                with_size = [self.edges[number] for number in small_edge_numbers
+                             if self.edge_clearance[number] >= 1]
+            else:
+                with_size = [edge for edge, clearance in zip(self.edges, self.edge_clearance)
+                             if clearance >= player_size]
 
-        grid = self._grid
-        with_obstacles = []
-        for edge in edges:
-            if not grid.get_cell(edge).is_obstacle:
-                with_obstacles.append(edge)
-
-        with_size = []
-        for edge in with_obstacles:
-            if grid.check_square_size(edge, player_size):
-                with_size.append(edge)
-
-        self.neighbor_cache[(self.coord, player_size)] = with_size
-        self.cache_version = self._grid.cache_version
+        self.neighbor_cache[player_size] = with_size
         return with_size
 
     def cost(self, next_cell, max_cost):
@@ -96,10 +111,34 @@ class GridCell:
 
 
 class Grid:
+    # grids that can't afford a component index over all of their cells turn it off
+    use_components = True
+
     def __init__(self):
         self._grid = {}
         self.cache_version = 0
 
+        # Clearance is the largest square (capped at max_player_size) that fits with its lower left
+        # corner at a cell. Only cells close to obstacles are stored, the rest have max_player_size.
+        self._clearance = {}
+
+        # largest player size whose footprint was checked, neighbor_influence has to reach that far
+        self.largest_player_size = max_player_size
+
+        # called with (coord, is_obstacle) after every obstacle change
+        self._obstacle_listeners = []
+
+        self._flow_fields = None
+
+        # get_path results, path_cache.hits and path_cache.misses count how well it works
+        self.path_cache = PathCache(self)
+
+        # tells if a goal can be reached at all, per player size. None skips the check
+        self.components = ConnectedComponents(self) if self.use_components else None
+
+        # searchStats.SearchStats that records every search_path query, None records nothing
+        self.stats = None
+
     def get_cell(self, coordinate):
         cell = self._grid.get(coordinate, None)
         if cell is None:
@@ -108,19 +147,19 @@ class Grid:
         return cell
 
     @staticmethod
-    def heuristic(a, b):
-        (x1, y1) = a.coord
-        (x2, y2) = b.coord
-        return abs(x1 - x2) + abs(y1 - y2)
+    def heuristic(a, b, player_size=1):
+        return movement_heuristic(player_size)(a.coord, b.coord)
 
-    def reconstruct_path(self, came_from, start, goal, reversed_path=True):
+    def reconstruct_path(self, came_from, start, goal, reversed_path=True, compact=False):
+        # compact builds a PathBuffer instead of a list of tuples
         current = self.get_cell(goal)
-        path = [current.coord]
+        path = new_path(compact)
+        path.append(current.coord)
         start_cell = self.get_cell(start)
         while current != start_cell:
             current = came_from.get(current, None)
             if current is None:
-                return []
+                return new_path(compact)
             path.append(current.coord)
 
         if not reversed_path:
@@ -132,7 +171,7 @@ class Grid:
         frontier = PriorityQueue()
         start_cell = self.get_cell(start)
         goal_cell = self.get_cell(goal)
-        frontier.put(start_cell, 0)
+        frontier.put(start_cell, (0, 0))
         came_from = {}
         cost_so_far = {start_cell: 0}
         came_from[start_cell] = None
@@ -140,8 +179,13 @@ class Grid:
         if start_cell.cost(goal_cell, max_cost) >= max_cost:
             return {}, {}
 
+        heuristic = movement_heuristic(player_size)
+        goal_coord = goal_cell.coord
+        stats = self.stats
         while not frontier.empty():
             current = frontier.get()
+            if stats is not None:
+                stats.expand(current.coord)
 
             if current == goal_cell:
                 break
@@ -153,13 +197,185 @@ class Grid:
                     continue
                 if next_cell not in cost_so_far or new_cost < cost_so_far[next_cell]:
                     cost_so_far[next_cell] = new_cost
-                    priority = new_cost + self.heuristic(goal_cell, next_cell)
-                    frontier.put(next_cell, priority)
+                    # on equal cost prefer the cell closer to the goal
+                    estimate = heuristic(goal_coord, next_cell_coord)
+                    frontier.put(next_cell, (new_cost + estimate, estimate))
                     came_from[next_cell] = current
+                    if stats is not None:
+                        stats.push()
+
+        return came_from, cost_so_far
+
+    def jump_point_search(self, start, goal, player_size, max_cost=50):
+        # Jump point search (Harabor & Grastien) for players moving on all 8 edges. Moves follow
+        # the same rules as GridCell.neighbors, any edge whose square fits can be taken, so
+        # came_from links jump points that are always on a straight or diagonal line.
+        if self.is_obstacle_at(start) or self.is_obstacle_at(goal):
+            return {}, {}
+        if math.hypot(goal[0] - start[0], goal[1] - start[1]) >= max_cost:
+            return {}, {}
+
+        fits = self.square_test(player_size)
+        frontier = PriorityQueue()
+        frontier.put(start, (0, 0))
+        came_from = {start: None}
+        cost_so_far = {start: 0}
+        stats = self.stats
+
+        while not frontier.empty():
+            current = frontier.get()
+            if stats is not None:
+                stats.expand(current)
+
+            if current == goal:
+                break
+
+            for dx, dy in self._jump_directions(fits, current, came_from[current]):
+                jump = self._jump(fits, current, dx, dy, goal, cost_so_far[current], max_cost)
+                if jump is None:
+                    continue
+                jump_point, new_cost = jump
+                if jump_point not in cost_so_far or new_cost < cost_so_far[jump_point]:
+                    cost_so_far[jump_point] = new_cost
+                    estimate = octile_distance(goal, jump_point)
+                    frontier.put(jump_point, (new_cost + estimate, estimate))
+                    came_from[jump_point] = current
+                    if stats is not None:
+                        stats.push()
 
         return came_from, cost_so_far
 
+    @staticmethod
+    def _jump_directions(fits, coord, parent):
+        if parent is None:
+            return [(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1) if dx or dy]
+
+        x_cord, y_cord = coord
+        dx = (x_cord > parent[0]) - (x_cord < parent[0])
+        dy = (y_cord > parent[1]) - (y_cord < parent[1])
+
+        # natural neighbors plus the forced ones next to blocked cells
+        if dx and dy:
+            directions = [(0, dy), (dx, 0), (dx, dy)]
+            if not fits(x_cord - dx, y_cord):
+                directions.append((-dx, dy))
+            if not fits(x_cord, y_cord - dy):
+                directions.append((dx, -dy))
+        elif dx:
+            directions = [(dx, 0)]
+            if not fits(x_cord, y_cord + 1):
+                directions.append((dx, 1))
+            if not fits(x_cord, y_cord - 1):
+                directions.append((dx, -1))
+        else:
+            directions = [(0, dy)]
+            if not fits(x_cord + 1, y_cord):
+                directions.append((1, dy))
+            if not fits(x_cord - 1, y_cord):
+                directions.append((-1, dy))
+        return directions
+
+    def _jump(self, fits, coord, dx, dy, goal, cost, max_cost):
+        # walks from coord in (dx, dy) until it finds a jump point, returns it with its cost. The
+        # walk stops once no path through the cell can reach the goal within max_cost.
+        x_cord, y_cord = coord
+        step_cost = diagonal_cost if dx and dy else 1.0
+        for _ in range(max_jump_length):
+            x_cord += dx
+            y_cord += dy
+            cost += step_cost
+            if cost + octile_distance(goal, (x_cord, y_cord)) >= max_cost or not fits(x_cord, y_cord):
+                return None
+            if (x_cord, y_cord) == goal:
+                return goal, cost
+
+            if dx and dy:
+                if (fits(x_cord - dx, y_cord + dy) and not fits(x_cord - dx, y_cord)) or \
+                        (fits(x_cord + dx, y_cord - dy) and not fits(x_cord, y_cord - dy)):
+                    return (x_cord, y_cord), cost
+                if self._jump(fits, (x_cord, y_cord), dx, 0, goal, cost, max_cost) is not None or \
+                        self._jump(fits, (x_cord, y_cord), 0, dy, goal, cost, max_cost) is not None:
+                    return (x_cord, y_cord), cost
+            elif dx:
+                if (fits(x_cord + dx, y_cord + 1) and not fits(x_cord, y_cord + 1)) or \
+                        (fits(x_cord + dx, y_cord - 1) and not fits(x_cord, y_cord - 1)):
+                    return (x_cord, y_cord), cost
+            else:
+                if (fits(x_cord + 1, y_cord + dy) and not fits(x_cord + 1, y_cord)) or \
+                        (fits(x_cord - 1, y_cord + dy) and not fits(x_cord - 1, y_cord)):
+                    return (x_cord, y_cord), cost
+
+        # a long jump stops at a plain cell, the search goes on from there like from a jump point
+        return (x_cord, y_cord), cost
+
+    @staticmethod
+    def reconstruct_jump_path(came_from, start, goal, reversed_path=True, compact=False):
+        # fills in the grid steps between the jump points
+        path = new_path(compact)
+        if goal not in came_from:
+            return path
+
+        current = goal
+        path.append(goal)
+        while current != start:
+            parent = came_from[current]
+            dx = (parent[0] > current[0]) - (parent[0] < current[0])
+            dy = (parent[1] > current[1]) - (parent[1] < current[1])
+            x_cord, y_cord = current
+            while (x_cord, y_cord) != parent:
+                x_cord += dx
+                y_cord += dy
+                path.append((x_cord, y_cord))
+            current = parent
+
+        if not reversed_path:
+            path.reverse()
+
+        return path
+
+    def is_obstacle_at(self, coord):
+        cell = self._grid.get(coord, None)
+        return cell is not None and cell.is_obstacle
+
+    def obstacle_coords(self):
+        return [coord for coord, cell in self._grid.items() if cell.is_obstacle]
+
+    def get_clearance(self, coord):
+        return self._clearance.get(coord, max_player_size)
+
+    def _set_clearance(self, coord, clearance):
+        if clearance < max_player_size:
+            self._clearance[coord] = clearance
+        else:
+            self._clearance.pop(coord, None)
+
+    def _update_clearance(self, coord):
+        # Only cells that have coord inside their (capped) square can change
+        x_coord, y_coord = coord
+        self._update_clearance_area(x_coord - max_player_size + 1, y_coord - max_player_size + 1, x_coord, y_coord)
+
+    def _update_clearance_area(self, x_min, y_min, x_max, y_max):
+        # Walk the cells from the top right so the cells each clearance depends on are already up
+        # to date, cells right of or above the area keep their clearance.
+        get_clearance = self.get_clearance
+        for x in range(x_max, x_min - 1, -1):
+            for y in range(y_max, y_min - 1, -1):
+                if self.is_obstacle_at((x, y)):
+                    clearance = 0
+                else:
+                    clearance = 1 + min(
+                        get_clearance((x + 1, y)),
+                        get_clearance((x, y + 1)),
+                        get_clearance((x + 1, y + 1)),
+                    )
+                self._set_clearance((x, y), min(clearance, max_player_size))
+
     def check_square_size(self, coord, player_size):
+        if player_size <= max_player_size:
+            return self.get_clearance(coord) >= player_size
+        if player_size > self.largest_player_size:
+            self.largest_player_size = player_size
+
         for x in range(0, player_size):
             for y in range(0, player_size):
                 x_coord, y_coord = coord
@@ -169,31 +385,657 @@ class Grid:
 
         return True
 
-    def get_path(self, start, goal, player_size, max_cost=50):
+    def square_test(self, player_size):
+        # check_square_size as a fast fits(x, y) function for the inner loops of the searches
+        if player_size > max_player_size:
+            return lambda x, y: self.check_square_size((x, y), player_size)
+
+        clearance = self._clearance
+        return lambda x, y: clearance.get((x, y), max_player_size) >= player_size
+
+    def get_path(self, start, goal, player_size, max_cost=50, algorithm='astar', compact=False):
+        # compact returns the path as a PathBuffer instead of a list of tuples
+        key = (start, goal, player_size, max_cost, algorithm, compact)
+        cached = self.path_cache.get(key)
+        if cached is not None:
+            return cached
+
+        path, cost = self.search_path(start, goal, player_size, max_cost, algorithm, compact)
+        self.path_cache.put(key, start, goal, max_cost, path, cost)
+        return path, cost
+
+    def search_path(self, start, goal, player_size, max_cost=50, algorithm='astar', compact=False):
+        # get_path without the cache
+        stats = self.stats
+        if stats is None:
+            return self._search_path(start, goal, player_size, max_cost, algorithm, compact)
+
+        stats.begin_query(start, goal, player_size, algorithm)
+        path, cost = self._search_path(start, goal, player_size, max_cost, algorithm, compact)
+        stats.end_query(cost, 'search')
+        return path, cost
+
+    def _search_path(self, start, goal, player_size, max_cost, algorithm, compact=False):
+        # Jump point search needs diagonal moves, size 1 players always use plain A*
+        stats = self.stats
+        if self.components is not None and not self.components.can_reach(start, goal, player_size):
+            return new_path(compact), -1
+        if stats is not None:
+            stats.lap('reachability')
+
+        # Bidirectional A* (a full cell path) and Theta* (only the turning points) return their
+        # path themselves instead of a came_from map, it only needs converting to a buffer
+        if algorithm in ('bidirectional', 'theta'):
+            search = bidirectional_search if algorithm == 'bidirectional' else theta_star_search
+            path, cost = search(self, start, goal, player_size, max_cost)
+            return (PathBuffer.from_path(path) if compact else path), cost
+
+        if algorithm == 'jps' and player_size > 1:
+            came_from, cost = self.jump_point_search(
+                start=start,
+                goal=goal,
+                player_size=player_size,
+                max_cost=max_cost
+            )
+            if stats is not None:
+                stats.lap('search')
+
+            if len(came_from) == 0:
+                return new_path(compact), -1
+
+            path = self.reconstruct_jump_path(
+                came_from=came_from,
+                start=start,
+                goal=goal,
+                reversed_path=True,
+                compact=compact
+            )
+            if stats is not None:
+                stats.lap('reconstruct')
+
+            return path, cost.get(goal, 0)
+
         came_from, cost = self.a_star_search(
             start=start,
             goal=goal,
             player_size=player_size,
             max_cost=max_cost
         )
+        if stats is not None:
+            stats.lap('search')
 
         if len(came_from) == 0:
-            return [], -1
+            return new_path(compact), -1
 
         path = self.reconstruct_path(
             came_from=came_from,
             start=start,
             goal=goal,
-            reversed_path=True
+            reversed_path=True,
+            compact=compact
         )
+        if stats is not None:
+            stats.lap('reconstruct')
+
+        return path, cost.get(self._search_key(goal), 0)
+
+    def _search_key(self, coord):
+        # key used by a_star_search for the cell at coord
+        return self.get_cell(coord)
+
+    def bounds(self):
+        # (x_min, y_min, x_max, y_max) of the cells that exist, None when the grid has no edge
+        return None
+
+    def get_flow_field(self, goals, player_size, max_cost=50):
+        # FlowField towards the closest of goals, kept until an obstacle change affects it
+        if self._flow_fields is None:
+            self._flow_fields = FlowFieldCache(self, self.bounds())
+        return self._flow_fields.get(goals, player_size, max_cost)
+
+    def get_paths(self, requests, max_cost=50, compact=False):
+        # Paths for a list of (start, goal, player_size) requests, returned in the same order and
+        # shape as get_path. Requests that share a goal and player size share one search tree.
+        groups = {}
+        for number, (start, goal, player_size) in enumerate(requests):
+            groups.setdefault((goal, player_size), []).append(number)
+
+        stats = self.stats
+        results = [None] * len(requests)
+        for (goal, player_size), numbers in groups.items():
+            # each shared search is recorded as one query without a start
+            if stats is not None:
+                stats.begin_query(None, goal, player_size, 'goal')
+            starts = [requests[number][0] for number in numbers]
+            came_from, cost = self.goal_search(goal, player_size, starts, max_cost)
+            if stats is not None:
+                stats.lap('search')
+            for number, start in zip(numbers, starts):
+                key = self._search_key(start)
+                if key not in cost:
+                    results[number] = new_path(compact), -1
+                    continue
+
+                path = self.reconstruct_goal_path(came_from, start, reversed_path=True, compact=compact)
+                results[number] = path, cost[key]
+            if stats is not None:
+                stats.end_query(None, 'reconstruct')
+
+        return results
+
+    def goal_search(self, goal, player_size, starts, max_cost=50):
+        # Dijkstra outwards from the goal. Moves between cells the player fits in go both ways, so
+        # came_from leads each reached cell towards the goal. A start the player does not fit in
+        # can still step out to a neighbor, it is linked to its best neighbor at the end.
+        goal_cell = self.get_cell(goal)
+        if goal_cell.is_obstacle:
+            return {}, {}
+
+        came_from = {goal_cell: None}
+        cost_so_far = {goal_cell: 0}
+        start_cells = [self.get_cell(start) for start in starts]
+        if not self.check_square_size(goal, player_size):
+            return came_from, cost_so_far
+
+        # the search is done once every cell a start depends on is settled
+        waiting = set()
+        for start_cell in start_cells:
+            if self.check_square_size(start_cell.coord, player_size):
+                waiting.add(start_cell)
+            else:
+                waiting.update(self.get_cell(coord) for coord in start_cell.neighbors(player_size))
+
+        stats = self.stats
+        frontier = PriorityQueue()
+        frontier.put(goal_cell, 0)
+        while waiting and not frontier.empty():
+            current = frontier.get()
+            waiting.discard(current)
+            if stats is not None:
+                stats.expand(current.coord)
+
+            for next_cell_coord in current.neighbors(player_size):
+                next_cell = self.get_cell(next_cell_coord)
+                new_cost = cost_so_far[current] + current.cost(next_cell, max_cost)
+                if new_cost >= max_cost:
+                    continue
+                if next_cell not in cost_so_far or new_cost < cost_so_far[next_cell]:
+                    cost_so_far[next_cell] = new_cost
+                    frontier.put(next_cell, new_cost)
+                    came_from[next_cell] = current
+                    if stats is not None:
+                        stats.push()
+
+        for start_cell in start_cells:
+            if start_cell in cost_so_far:
+                continue
+            for next_cell_coord in start_cell.neighbors(player_size):
+                next_cell = self.get_cell(next_cell_coord)
+                if next_cell not in cost_so_far:
+                    continue
+                new_cost = cost_so_far[next_cell] + start_cell.cost(next_cell, max_cost)
+                if new_cost < max_cost and new_cost < cost_so_far.get(start_cell, max_cost):
+                    cost_so_far[start_cell] = new_cost
+                    came_from[start_cell] = next_cell
+
+        return came_from, cost_so_far
+
+    def reconstruct_goal_path(self, came_from, start, reversed_path=True, compact=False):
+        current = self.get_cell(start)
+        path = new_path(compact)
+        while current is not None:
+            path.append(current.coord)
+            current = came_from[current]
 
-        return path, cost.get(self.get_cell(goal), 0)
+        if reversed_path:
+            path.reverse()
+
+        return path
 
     def set_cell_is_obstacle(self, coord, is_obstacle):
         self.get_cell(coord).is_obstacle = is_obstacle
+        self._update_clearance(coord)
+        self.invalidate_neighbor_cache(coord)
+        self._notify_obstacle_listeners(coord, is_obstacle)
+
+    def set_cells_are_obstacles(self, coords, is_obstacle=True):
+        # set_cell_is_obstacle for many cells, with one clearance pass and one cache invalidation
+        changed = [coord for coord in coords if self.is_obstacle_at(coord) != is_obstacle]
+        if not changed:
+            return
+
+        for coord in changed:
+            self.get_cell(coord).is_obstacle = is_obstacle
+        self._update_clearance_area(
+            min(x for x, _ in changed) - max_player_size + 1,
+            min(y for _, y in changed) - max_player_size + 1,
+            max(x for x, _ in changed),
+            max(y for _, y in changed))
+        self.cache_version += 1
+
+        for coord in changed:
+            self._notify_obstacle_listeners(coord, is_obstacle)
+
+    def add_obstacle_listener(self, listener):
+        self._obstacle_listeners.append(listener)
+
+    def remove_obstacle_listener(self, listener):
+        self._obstacle_listeners.remove(listener)
+
+    def _notify_obstacle_listeners(self, coord, is_obstacle):
+        for listener in self._obstacle_listeners:
+            listener(coord, is_obstacle)
+
+    def neighbor_influence(self, coord):
+        # Box (x_min, y_min, x_max, y_max) of the cells whose neighbors can change with coord. A
+        # cell only looks at the square footprints of its edges, so that is up to the largest
+        # player size checked so far below/left of coord and one above/right of it.
+        x_coord, y_coord = coord
+        reach = self.largest_player_size
+        return x_coord - reach, y_coord - reach, x_coord + 1, y_coord + 1
+
+    def invalidate_neighbor_cache(self, coord):
+        x_min, y_min, x_max, y_max = self.neighbor_influence(coord)
+        grid = self._grid
+        for x in range(x_min, x_max + 1):
+            for y in range(y_min, y_max + 1):
+                cell = grid.get((x, y), None)
+                if cell is not None and cell.neighbor_cache:
+                    cell.edge_clearance = None
+                    cell.neighbor_cache = {}
+
+    def snapshot(self):
+        # Snapshot of the box around the obstacles, with the component labels built so far
+        coords = self.obstacle_coords()
+        if coords:
+            x_origin = min(x for x, _ in coords)
+            y_origin = min(y for _, y in coords)
+            width = max(x for x, _ in coords) - x_origin + 1
+            height = max(y for _, y in coords) - y_origin + 1
+        else:
+            x_origin = y_origin = width = height = 0
+
+        obstacles = bytearray(width * height)
+        for x_cord, y_cord in coords:
+            obstacles[(y_cord - y_origin) * width + x_cord - x_origin] = 1
+
+        snapshot = Snapshot(GRID, (x_origin, y_origin), width, height, obstacles)
+        if self.components is not None:
+            snapshot.components = self.components.export_labels()
+        return snapshot
+
+    def save_snapshot(self, path):
+        write_snapshot(path, self.snapshot())
+
+    @classmethod
+    def load_snapshot(cls, path):
+        return cls.from_snapshot(read_snapshot(path))
+
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        grid = cls()
+        grid.set_cells_are_obstacles(snapshot.obstacle_coords())
+        if snapshot.kind == GRID and grid.components is not None:
+            grid.components.load_labels(snapshot.components)
+        return grid
+
+
+class DenseGridCell:
+    # Light weight view of a DenseGrid cell, these are created on demand and never stored
+    def __init__(self, coordinate, grid):
+        self._grid = grid
+        self._coordinate = coordinate
+        self.index = grid.index(coordinate)
+
+    @property
+    def coord(self):
+        return self._coordinate
+
+    @property
+    def is_obstacle(self):
+        # everything outside the grid is treated as a wall
+        return self.index is None or self._grid.obstacles[self.index] != 0
+
+    def neighbors(self, player_size):
+        if self.is_obstacle:
+            return []
+
+        grid = self._grid
+        return [grid.coord(index) for index, _ in grid.neighbor_steps(self.index, player_size)]
+
+    def cost(self, next_cell, max_cost):
+        if self.is_obstacle or next_cell.is_obstacle:
+            return max_cost
+        current_coord = self._coordinate
+        next_coord = next_cell.coord
+        return math.hypot(next_coord[0] - current_coord[0], next_coord[1] - current_coord[1])
+
+    def __eq__(self, other):
+        return isinstance(other, DenseGridCell) and self._grid is other._grid and self._coordinate == other._coordinate
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __hash__(self):
+        return hash(self._coordinate)
+
+
+class DenseGrid(Grid):
+    # Bounded grid that stores one obstacle byte per cell instead of a GridCell object,
+    # searches run on flat integer indices (y * width + x).
+    def __init__(self, width, height, obstacles=None, clearance=None):
+        # obstacles and clearance can be passed in to start from the buffers of a snapshot
+        Grid.__init__(self)
+        self.width = width
+        self.height = height
+        self.obstacles = obstacles if obstacles is not None else bytearray(width * height)
+        if clearance is not None:
+            self.clearance = clearance
+        else:
+            self.clearance = bytearray(width * height)
+            self._rebuild_clearance()
+
+        # (dx, dy, cost) in the same order as GridCell.edges and GridCell.small_edges
+        diagonal = math.hypot(1, 1)
+        self._edges = [
+            (0, 1, 1.0),
+            (1, 1, diagonal),
+            (1, 0, 1.0),
+            (1, -1, diagonal),
+            (0, -1, 1.0),
+            (-1, -1, diagonal),
+            (-1, 0, 1.0),
+            (-1, 1, diagonal),
+        ]
+        self._small_edges = [
+            (0, 1, 1.0),
+            (0, -1, 1.0),
+            (1, 0, 1.0),
+            (-1, 0, 1.0),
+        ]
+
+    def index(self, coordinate):
+        x_cord, y_cord = coordinate
+        if 0 <= x_cord < self.width and 0 <= y_cord < self.height:
+            return y_cord * self.width + x_cord
+        return None
+
+    def coord(self, index):
+        return index % self.width, index // self.width
+
+    def get_cell(self, coordinate):
+        return DenseGridCell(coordinate, self)
+
+    def bounds(self):
+        return 0, 0, self.width, self.height
+
+    def is_obstacle_at(self, coord):
+        index = self.index(coord)
+        return index is None or self.obstacles[index] != 0
+
+    def obstacle_coords(self):
+        width = self.width
+        return [(index % width, index // width) for index, obstacle in enumerate(self.obstacles) if obstacle]
+
+    def get_clearance(self, coord):
+        index = self.index(coord)
+        if index is None:
+            return 0
+        return self.clearance[index]
+
+    def _set_clearance(self, coord, clearance):
+        index = self.index(coord)
+        if index is not None:
+            self.clearance[index] = clearance
+
+    def _rebuild_clearance(self):
+        # standard dynamic programming pass, every cell only depends on the cells right, above
+        # and diagonally up right of it, cells outside of the grid have no clearance
+        width = self.width
+        obstacles = self.obstacles
+        clearance = self.clearance
+        row_above = [0] * (width + 1)
+        for y_cord in range(self.height - 1, -1, -1):
+            row = [0] * (width + 1)
+            row_start = y_cord * width
+            for x_cord in range(width - 1, -1, -1):
+                if not obstacles[row_start + x_cord]:
+                    row[x_cord] = min(1 + min(row[x_cord + 1], row_above[x_cord], row_above[x_cord + 1]),
+                                      max_player_size)
+            clearance[row_start:row_start + width] = bytearray(row[:width])
+            row_above = row
+
+    def _square_is_free(self, index, player_size):
+        obstacles = self.obstacles
+        width = self.width
+        for row in range(index, index + player_size * width, width):
+            if any(obstacles[row:row + player_size]):
+                return False
+        return True
+
+    def check_square_size(self, coord, player_size):
+        if player_size <= max_player_size:
+            return self.get_clearance(coord) >= player_size
+        if player_size > self.largest_player_size:
+            self.largest_player_size = player_size
+
+        x_coord, y_coord = coord
+        if x_coord < 0 or y_coord < 0 or x_coord + player_size > self.width or y_coord + player_size > self.height:
+            return False
+        return self._square_is_free(y_coord * self.width + x_coord, player_size)
+
+    def square_test(self, player_size):
+        if player_size > max_player_size:
+            return Grid.square_test(self, player_size)
+
+        width = self.width
+        height = self.height
+        clearance = self.clearance
+
+        def fits(x, y):
+            return 0 <= x < width and 0 <= y < height and clearance[y * width + x] >= player_size
+        return fits
+
+    def neighbor_steps(self, index, player_size):
+        # returns (index, cost) for every cell a player can step to from index
+        width = self.width
+        max_x = width - player_size
+        max_y = self.height - player_size
+        x_cord = index % width
+        y_cord = index // width
+        clearance = self.clearance
+        small_player = player_size <= max_player_size
+        if player_size > self.largest_player_size:
+            self.largest_player_size = player_size
+
+        edges = self._small_edges if player_size == 1 else self._edges
+        steps = []
+        for dx, dy, cost in edges:
+            x_next = x_cord + dx
+            y_next = y_cord + dy
+            if x_next < 0 or y_next < 0 or x_next > max_x or y_next > max_y:
+                continue
+            next_index = index + dy * width + dx
+            if small_player:
+                if clearance[next_index] >= player_size:
+                    steps.append((next_index, cost))
+            elif self._square_is_free(next_index, player_size):
+                steps.append((next_index, cost))
+
+        return steps
+
+    def a_star_search(self, start, goal, player_size, max_cost=50):
+        start_index = self.index(start)
+        goal_index = self.index(goal)
+        if start_index is None or goal_index is None:
+            return {}, {}
+
+        obstacles = self.obstacles
+        if obstacles[start_index] or obstacles[goal_index]:
+            return {}, {}
+        if math.hypot(goal[0] - start[0], goal[1] - start[1]) >= max_cost:
+            return {}, {}
+
+        width = self.width
+        heuristic = movement_heuristic(player_size)
+        frontier = PriorityQueue()
+        frontier.put(start_index, (0, 0))
+        came_from = {start_index: None}
+        cost_so_far = {start_index: 0}
+
+        stats = self.stats
+        edge_count = len(self._small_edges if player_size == 1 else self._edges)
+        while not frontier.empty():
+            current = frontier.get()
+            if stats is not None:
+                stats.expand((current % width, current // width))
+
+            if current == goal_index:
+                break
+
+            if stats is not None:
+                # neighbor_steps has no cache, every step is a footprint check
+                stats.current.square_checks += edge_count
+            current_cost = cost_so_far[current]
+            for next_index, step_cost in self.neighbor_steps(current, player_size):
+                new_cost = current_cost + step_cost
+                if new_cost >= max_cost:
+                    continue
+                if next_index not in cost_so_far or new_cost < cost_so_far[next_index]:
+                    cost_so_far[next_index] = new_cost
+                    estimate = heuristic(goal, (next_index % width, next_index // width))
+                    frontier.put(next_index, (new_cost + estimate, estimate))
+                    came_from[next_index] = current
+                    if stats is not None:
+                        stats.push()
+
+        return came_from, cost_so_far
+
+    def reconstruct_path(self, came_from, start, goal, reversed_path=True, compact=False):
+        current = self.index(goal)
+        start_index = self.index(start)
+        path = new_path(compact)
+        path.append(goal)
+        while current != start_index:
+            current = came_from.get(current, None)
+            if current is None:
+                return new_path(compact)
+            path.append(self.coord(current))
+
+        if not reversed_path:
+            path.reverse()
+
+        return path
+
+    def _search_key(self, coord):
+        return self.index(coord)
+
+    def goal_search(self, goal, player_size, starts, max_cost=50):
+        goal_index = self.index(goal)
+        if goal_index is None or self.obstacles[goal_index]:
+            return {}, {}
+
+        came_from = {goal_index: None}
+        cost_so_far = {goal_index: 0}
+        start_indices = [self.index(start) for start in starts]
+        if not self.check_square_size(goal, player_size):
+            return came_from, cost_so_far
+
+        waiting = set()
+        for start, start_index in zip(starts, start_indices):
+            if start_index is None or self.obstacles[start_index]:
+                continue
+            if self.check_square_size(start, player_size):
+                waiting.add(start_index)
+            else:
+                waiting.update(next_index for next_index, _ in self.neighbor_steps(start_index, player_size))
+
+        stats = self.stats
+        width = self.width
+        frontier = PriorityQueue()
+        frontier.put(goal_index, 0)
+        while waiting and not frontier.empty():
+            current = frontier.get()
+            waiting.discard(current)
+            if stats is not None:
+                stats.expand((current % width, current // width))
+
+            current_cost = cost_so_far[current]
+            for next_index, step_cost in self.neighbor_steps(current, player_size):
+                new_cost = current_cost + step_cost
+                if new_cost >= max_cost:
+                    continue
+                if next_index not in cost_so_far or new_cost < cost_so_far[next_index]:
+                    cost_so_far[next_index] = new_cost
+                    frontier.put(next_index, new_cost)
+                    came_from[next_index] = current
+                    if stats is not None:
+                        stats.push()
+
+        for start_index in start_indices:
+            if start_index is None or start_index in cost_so_far or self.obstacles[start_index]:
+                continue
+            for next_index, step_cost in self.neighbor_steps(start_index, player_size):
+                if next_index not in cost_so_far:
+                    continue
+                new_cost = cost_so_far[next_index] + step_cost
+                if new_cost < max_cost and new_cost < cost_so_far.get(start_index, max_cost):
+                    cost_so_far[start_index] = new_cost
+                    came_from[start_index] = next_index
+
+        return came_from, cost_so_far
+
+    def reconstruct_goal_path(self, came_from, start, reversed_path=True, compact=False):
+        current = self.index(start)
+        path = new_path(compact)
+        while current is not None:
+            path.append(self.coord(current))
+            current = came_from[current]
+
+        if reversed_path:
+            path.reverse()
+
+        return path
+
+    def set_cell_is_obstacle(self, coord, is_obstacle):
+        index = self.index(coord)
+        if index is None:
+            raise IndexError('{} is outside of the {}x{} grid'.format(coord, self.width, self.height))
+        self.obstacles[index] = 1 if is_obstacle else 0
+        self._update_clearance(coord)
         self.cache_version += 1
+        self._notify_obstacle_listeners(coord, is_obstacle)
 
-    def update_player_size(self):
+    def set_cells_are_obstacles(self, coords, is_obstacle=True):
+        coords = list(coords)
+        indices = [self.index(coord) for coord in coords]
+        for coord, index in zip(coords, indices):
+            if index is None:
+                raise IndexError('{} is outside of the {}x{} grid'.format(coord, self.width, self.height))
+
+        value = 1 if is_obstacle else 0
+        changed = [coord for coord, index in zip(coords, indices) if self.obstacles[index] != value]
+        if not changed:
+            return
+
+        for index in indices:
+            self.obstacles[index] = value
+        self._rebuild_clearance()
         self.cache_version += 1
 
+        for coord in changed:
+            self._notify_obstacle_listeners(coord, is_obstacle)
+
+    def snapshot(self):
+        snapshot = Snapshot(DENSE_GRID, (0, 0), self.width, self.height, self.obstacles)
+        snapshot.clearance = self.clearance
+        snapshot.components = self.components.export_labels()
+        return snapshot
 
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        if snapshot.kind != DENSE_GRID or snapshot.origin != (0, 0):
+            raise ValueError('DenseGrid can only be loaded from a dense grid snapshot')
+        grid = cls(snapshot.width, snapshot.height, snapshot.obstacles, snapshot.clearance)
+        grid.components.load_labels(snapshot.components)
+        return grid
@@ -0,0 +1,25 @@
+# Distance estimates that guide the path searches. Which one is admissible depends on how the
+# player moves, see movement_heuristic.
+
+import math
+
+diagonal_cost = math.hypot(1, 1)
+
+
+def manhattan_distance(a, b):
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def octile_distance(a, b):
+    dx = abs(a[0] - b[0])
+    dy = abs(a[1] - b[1])
+    if dx < dy:
+        return dy + (diagonal_cost - 1) * dx
+    return dx + (diagonal_cost - 1) * dy
+
+
+def movement_heuristic(player_size):
+    # size 1 players only use the 4 straight edges, everyone else can also step diagonally
+    if player_size == 1:
+        return manhattan_distance
+    return octile_distance
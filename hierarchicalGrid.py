@@ -0,0 +1,334 @@
+# Hierarchical path finding (HPA*, Botea, Mueller & Schaeffer) on top of a Grid, DenseGrid or
+# DistanceGrid. The area is split in square clusters, entrances between neighboring clusters and
+# the costs between the entrances of a cluster are precomputed per player size. A path is first
+# found on that small abstract graph and then stitched together from the stored cluster paths.
+
+import math
+
+from heuristics import movement_heuristic
+from priorityQueue import PriorityQueue
+
+# entrances at least this wide get a transition at both ends instead of one in the middle
+wide_entrance = 6
+
+
+class AbstractLayer:
+    # abstract graph for one player size
+    def __init__(self, clusters):
+        # (cluster, neighboring cluster) with the lower cluster first -> [(cell in first cluster,
+        # cell in second cluster)]
+        self.entrances = {}
+        self.nodes = {}
+        # node -> {node: (cost, path from node to node)}
+        self.edges = {}
+        self.dirty = set(clusters)
+
+
+class HierarchicalGrid:
+    def __init__(self, grid, width, height, cluster_size=16):
+        self._grid = grid
+        self.width = width
+        self.height = height
+        self.cluster_size = cluster_size
+        self._layers = {}
+
+        grid.add_obstacle_listener(self._obstacle_changed)
+
+    def cluster_of(self, coord):
+        return coord[0] // self.cluster_size, coord[1] // self.cluster_size
+
+    def _clusters(self):
+        size = self.cluster_size
+        return [(x, y)
+                for x in range((self.width + size - 1) // size)
+                for y in range((self.height + size - 1) // size)]
+
+    def _cluster_rect(self, cluster):
+        size = self.cluster_size
+        x_min = cluster[0] * size
+        y_min = cluster[1] * size
+        return x_min, y_min, min(x_min + size, self.width), min(y_min + size, self.height)
+
+    def _cluster_neighbors(self, cluster):
+        # the clusters sharing a border or a corner with cluster, players bigger than one can step
+        # diagonally over a corner
+        x_cluster, y_cluster = cluster
+        x_last, y_last = self.cluster_of((self.width - 1, self.height - 1))
+        neighbors = []
+        for x in (x_cluster - 1, x_cluster, x_cluster + 1):
+            for y in (y_cluster - 1, y_cluster, y_cluster + 1):
+                if (x, y) != cluster and 0 <= x <= x_last and 0 <= y <= y_last:
+                    neighbors.append((x, y))
+        return neighbors
+
+    def _in_bounds(self, coord):
+        return 0 <= coord[0] < self.width and 0 <= coord[1] < self.height
+
+    def _obstacle_changed(self, coord, is_obstacle):
+        # only the clusters that can see the change have to be rebuilt
+        x_min, y_min, x_max, y_max = self._grid.neighbor_influence(coord)
+        x_first, y_first = self.cluster_of((max(x_min, 0), max(y_min, 0)))
+        x_last, y_last = self.cluster_of((min(x_max, self.width - 1), min(y_max, self.height - 1)))
+        clusters = [(x, y) for x in range(x_first, x_last + 1) for y in range(y_first, y_last + 1)]
+        for layer in self._layers.values():
+            layer.dirty.update(clusters)
+
+    def get_layer(self, player_size):
+        layer = self._layers.get(player_size, None)
+        if layer is None:
+            layer = AbstractLayer(self._clusters())
+            self._layers[player_size] = layer
+
+        if layer.dirty:
+            self._rebuild(layer, player_size)
+        return layer
+
+    def _rebuild(self, layer, player_size):
+        dirty = layer.dirty
+        layer.dirty = set()
+
+        # entrances only change on the borders of dirty clusters, but the nodes of the clusters on
+        # the other side of those borders change with them
+        affected = set(dirty)
+        for cluster in dirty:
+            for neighbor in self._cluster_neighbors(cluster):
+                border = (min(cluster, neighbor), max(cluster, neighbor))
+                if neighbor not in dirty or cluster < neighbor:
+                    layer.entrances[border] = self._find_entrances(border, player_size)
+                affected.add(neighbor)
+
+        for cluster in affected:
+            for node in layer.nodes.get(cluster, ()):
+                for other in layer.edges.pop(node, {}):
+                    layer.edges.get(other, {}).pop(node, None)
+
+            nodes = set()
+            for neighbor in self._cluster_neighbors(cluster):
+                border = (min(cluster, neighbor), max(cluster, neighbor))
+                for entrance in layer.entrances[border]:
+                    nodes.add(entrance[0] if border[0] == cluster else entrance[1])
+            layer.nodes[cluster] = nodes
+            for node in nodes:
+                layer.edges[node] = {}
+
+        for cluster in affected:
+            nodes = layer.nodes[cluster]
+            for node in nodes:
+                came_from, cost_so_far = self._local_search({node: 0}, cluster, player_size)
+                edges = layer.edges[node]
+                for other in nodes:
+                    if other != node and other in cost_so_far:
+                        edges[other] = (cost_so_far[other], self._trace(came_from, other))
+
+            for neighbor in self._cluster_neighbors(cluster):
+                border = (min(cluster, neighbor), max(cluster, neighbor))
+                for first, second in layer.entrances[border]:
+                    cost = math.hypot(second[0] - first[0], second[1] - first[1])
+                    layer.edges[first][second] = (cost, [first, second])
+                    layer.edges[second][first] = (cost, [second, first])
+
+    def _find_entrances(self, border, player_size):
+        first, second = border
+        x_min, y_min, x_max, y_max = self._cluster_rect(first)
+        if first[0] != second[0] and first[1] != second[1]:
+            # clusters that only share a corner, the diagonal step between the corner cells
+            if second[1] > first[1]:
+                pair = ((x_max - 1, y_max - 1), (x_max, y_max))
+            else:
+                pair = ((x_max - 1, y_min), (x_max, y_min - 1))
+            return [pair] if self._can_cross(pair[0], pair[1], player_size) else []
+
+        # straight steps over the border and the diagonal ones that stay between the two clusters
+        if first[0] != second[0]:
+            pairs = [((x_max - 1, y), (x_max, y)) for y in range(y_min, y_max)]
+            diagonals = [((x_max - 1, y), (x_max, y + dy))
+                         for y in range(y_min, y_max) for dy in (-1, 1) if y_min <= y + dy < y_max]
+        else:
+            pairs = [((x, y_max - 1), (x, y_max)) for x in range(x_min, x_max)]
+            diagonals = [((x, y_max - 1), (x + dx, y_max))
+                         for x in range(x_min, x_max) for dx in (-1, 1) if x_min <= x + dx < x_max]
+
+        entrances = []
+        crossed = set()
+        run = []
+        for pair in pairs + [None]:
+            if pair is not None and self._can_cross(pair[0], pair[1], player_size):
+                run.append(pair)
+                crossed.update(pair)
+                continue
+
+            if len(run) >= wide_entrance:
+                entrances.append(run[0])
+                entrances.append(run[-1])
+            elif run:
+                entrances.append(run[len(run) // 2])
+            run = []
+
+        # A diagonal step next to a straight one reaches the same run along the border, only the
+        # ones where the border can't be crossed straight need their own entrance
+        for first_cell, second_cell in diagonals:
+            if first_cell not in crossed and second_cell not in crossed and \
+                    self._can_cross(first_cell, second_cell, player_size):
+                entrances.append((first_cell, second_cell))
+
+        return entrances
+
+    def _can_cross(self, first, second, player_size):
+        grid = self._grid
+        return second in grid.get_cell(first).neighbors(player_size) and \
+            first in grid.get_cell(second).neighbors(player_size)
+
+    def _local_search(self, sources, cluster, player_size, max_cost=None):
+        # dijkstra from the {coord: cost} sources that never leaves the cluster
+        x_min, y_min, x_max, y_max = self._cluster_rect(cluster)
+        grid = self._grid
+        stats = getattr(grid, 'stats', None)
+        frontier = PriorityQueue()
+        came_from = {}
+        cost_so_far = {}
+        for source, cost in sources.items():
+            frontier.put(source, cost)
+            came_from[source] = None
+            cost_so_far[source] = cost
+
+        while not frontier.empty():
+            current = frontier.get()
+            if stats is not None:
+                stats.expand(current)
+            for next_coord in grid.get_cell(current).neighbors(player_size):
+                if not (x_min <= next_coord[0] < x_max and y_min <= next_coord[1] < y_max):
+                    continue
+                new_cost = cost_so_far[current] + math.hypot(next_coord[0] - current[0], next_coord[1] - current[1])
+                if max_cost is not None and new_cost >= max_cost:
+                    continue
+                if next_coord not in cost_so_far or new_cost < cost_so_far[next_coord]:
+                    cost_so_far[next_coord] = new_cost
+                    frontier.put(next_coord, new_cost)
+                    came_from[next_coord] = current
+                    if stats is not None:
+                        stats.push()
+
+        return came_from, cost_so_far
+
+    @staticmethod
+    def _trace(came_from, coord):
+        path = []
+        while coord is not None:
+            path.append(coord)
+            coord = came_from[coord]
+        path.reverse()
+        return path
+
+    def _can_enter(self, coord, player_size):
+        grid = self._grid
+        for neighbor in grid.get_cell(coord).neighbors(player_size):
+            return coord in grid.get_cell(neighbor).neighbors(player_size)
+        return False
+
+    def get_path(self, start, goal, player_size, max_cost=None):
+        stats = getattr(self._grid, 'stats', None)
+        if stats is None:
+            return self._get_path(start, goal, player_size, max_cost, None)
+
+        stats.begin_query(start, goal, player_size, 'hierarchy')
+        path, cost = self._get_path(start, goal, player_size, max_cost, stats)
+        stats.end_query(cost, 'refine')
+        return path, cost
+
+    def _get_path(self, start, goal, player_size, max_cost, stats):
+        if not self._in_bounds(start) or not self._in_bounds(goal) or self._grid.get_cell(start).is_obstacle:
+            return [], -1
+        if start == goal:
+            return [start], 0
+        if not self._can_enter(goal, player_size):
+            return [], -1
+
+        layer = self.get_layer(player_size)
+        goal_cluster = self.cluster_of(goal)
+        if stats is not None:
+            stats.lap('layer')
+
+        # A start the player doesn't fit in can only be left, the search goes on from its first
+        # steps, which may already be in other clusters
+        if self._can_enter(start, player_size):
+            first_steps = {start: 0}
+        else:
+            first_steps = dict((coord, math.hypot(coord[0] - start[0], coord[1] - start[1]))
+                               for coord in self._grid.get_cell(start).neighbors(player_size)
+                               if self._in_bounds(coord))
+
+        # Connect start and goal to the entrances of their clusters. Moves between cells that both
+        # fit are symmetric, so the search from the goal gives the costs towards it.
+        start_searches = {}
+        for cluster in set(self.cluster_of(coord) for coord in first_steps):
+            sources = dict((coord, cost) for coord, cost in first_steps.items() if self.cluster_of(coord) == cluster)
+            start_searches[cluster] = self._local_search(sources, cluster, player_size, max_cost)
+        goal_from, goal_costs = self._local_search({goal: 0}, goal_cluster, player_size, max_cost)
+        if stats is not None:
+            stats.lap('connect')
+
+        def successors(node):
+            if node == 'start':
+                steps = []
+                for cluster, (_, start_costs) in start_searches.items():
+                    steps.extend((other, start_costs[other]) for other in layer.nodes[cluster] if other in start_costs)
+                    if goal in start_costs:
+                        steps.append(('goal', start_costs[goal]))
+                return steps
+
+            steps = [(other, edge[0]) for other, edge in layer.edges[node].items()]
+            if node in goal_costs:
+                steps.append(('goal', goal_costs[node]))
+            return steps
+
+        heuristic = movement_heuristic(player_size)
+        frontier = PriorityQueue()
+        frontier.put('start', (0, 0))
+        came_from = {'start': None}
+        cost_so_far = {'start': 0}
+
+        while not frontier.empty():
+            current = frontier.get()
+
+            if current == 'goal':
+                break
+            # the start node stands for the start searches, which counted their own cells
+            if stats is not None and current != 'start':
+                stats.expand(current)
+
+            for next_node, step_cost in successors(current):
+                new_cost = cost_so_far[current] + step_cost
+                if max_cost is not None and new_cost >= max_cost:
+                    continue
+                if next_node not in cost_so_far or new_cost < cost_so_far[next_node]:
+                    cost_so_far[next_node] = new_cost
+                    estimate = 0 if next_node == 'goal' else heuristic(goal, next_node)
+                    frontier.put(next_node, (new_cost + estimate, estimate))
+                    came_from[next_node] = current
+                    if stats is not None:
+                        stats.push()
+
+        if stats is not None:
+            stats.lap('search')
+
+        if 'goal' not in came_from:
+            return [], -1
+
+        # refine the abstract path with the stored cluster paths
+        nodes = self._trace(came_from, 'goal')
+        path = [start]
+        for node, next_node in zip(nodes, nodes[1:]):
+            if node == 'start':
+                target = goal if next_node == 'goal' else next_node
+                segment = self._trace(start_searches[self.cluster_of(target)][0], target)
+                if segment[0] != start:
+                    segment.insert(0, start)
+            elif next_node == 'goal':
+                segment = self._trace(goal_from, node)
+                segment.reverse()
+            else:
+                segment = layer.edges[node][next_node][1]
+            path.extend(segment[1:])
+
+        path.reverse()
+        return path, cost_so_far['goal']
@@ -0,0 +1,205 @@
+# Checks the state the grids keep up to date on obstacle changes against the same grid built from
+# scratch: clearance, wall distances, connected components, D* Lite, flow fields, the path cache,
+# get_paths and snapshots. Random obstacles are toggled and after every change both grids have to
+# give the same answers.
+# Run with: python incrementalCheck.py [--edits 200] [--seed 1]
+
+import argparse
+import random
+import sys
+
+from dStarLite import DStarLite
+from distanceGrid import DistanceGrid
+from grid import DenseGrid, Grid, max_player_size
+
+width = 40
+height = 30
+obstacle_density = 0.2
+player_sizes = (1, 2, 3)
+max_cost = 60
+checks_per_edit = 3
+
+
+class Checker:
+    def __init__(self, make_grid, seed):
+        self._make_grid = make_grid
+        self._rnd = random.Random(seed)
+        self.grid = make_grid()
+        # a wall around the map keeps the searches of the unbounded grids from flooding outside
+        self.obstacles = set((x, y) for x, y in self._coords()
+                             if x in (0, width - 1) or y in (0, height - 1) or self._rnd.random() < obstacle_density)
+        self.grid.set_cells_are_obstacles(list(self.obstacles))
+        self.mismatches = []
+
+        # planners that follow every change, replaced now and then
+        self._planners = [self._new_planner() for _ in range(3)]
+
+    @staticmethod
+    def _coords():
+        return [(x, y) for x in range(width) for y in range(height)]
+
+    def _inner_cell(self):
+        return self._rnd.randrange(1, width - 1), self._rnd.randrange(1, height - 1)
+
+    def _free_cell(self):
+        while True:
+            coord = self._inner_cell()
+            if coord not in self.obstacles:
+                return coord
+
+    def _new_planner(self):
+        return DStarLite(self.grid, self._free_cell(), self._free_cell(), self._rnd.choice(player_sizes), max_cost)
+
+    def _fresh_grid(self):
+        grid = self._make_grid()
+        grid.set_cells_are_obstacles(list(self.obstacles))
+        return grid
+
+    @staticmethod
+    def _cost(result):
+        # some searches give a cost of 0 when there is no path
+        path, cost = result
+        return cost if path else -1
+
+    def _search(self, grid, start, goal, player_size):
+        search = getattr(grid, 'search_path', grid.get_path)
+        return self._cost(search(start, goal, player_size, max_cost))
+
+    def _check(self, what, got, expected):
+        if isinstance(got, float) or isinstance(expected, float):
+            same = abs(got - expected) < 1e-6
+        else:
+            same = got == expected
+        if not same:
+            self.mismatches.append('{} {}: {} instead of {}'.format(type(self.grid).__name__, what, got, expected))
+
+    def edit(self):
+        rnd = self._rnd
+        coords = [self._inner_cell() for _ in range(rnd.choice((1, 1, 1, 4)))]
+        is_obstacle = rnd.random() < 0.5
+        if len(coords) == 1:
+            self.grid.set_cell_is_obstacle(coords[0], is_obstacle)
+        else:
+            self.grid.set_cells_are_obstacles(coords, is_obstacle)
+        if is_obstacle:
+            self.obstacles.update(coords)
+        else:
+            self.obstacles.difference_update(coords)
+
+        if rnd.random() < 0.1:
+            planner = self._planners.pop(0)
+            planner.close()
+            self._planners.append(self._new_planner())
+
+    def check(self):
+        grid = self.grid
+        fresh = self._fresh_grid()
+        rnd = self._rnd
+
+        for coord in self._coords():
+            self._check('obstacle at {}'.format(coord), grid.get_cell(coord).is_obstacle, coord in self.obstacles)
+            if hasattr(grid, 'get_clearance'):
+                self._check('clearance at {}'.format(coord), grid.get_clearance(coord), fresh.get_clearance(coord))
+            if hasattr(grid, 'wall_distance'):
+                self._check('wall distance at {}'.format(coord), grid.wall_distance(coord), fresh.wall_distance(coord))
+
+        for planner in self._planners:
+            self._check('D* Lite {} -> {}'.format(planner.start, planner.goal), self._cost(planner.get_path()),
+                        self._search(fresh, planner.start, planner.goal, planner.player_size))
+
+        for _ in range(checks_per_edit):
+            start = self._free_cell()
+            goal = self._free_cell()
+            player_size = rnd.choice(player_sizes)
+            expected = self._search(fresh, start, goal, player_size)
+
+            components = getattr(grid, 'components', None)
+            if components is not None:
+                self._check('can reach {} -> {}'.format(start, goal),
+                            components.can_reach(start, goal, player_size),
+                            fresh.components.can_reach(start, goal, player_size))
+
+            self._check('cached path {} -> {}'.format(start, goal),
+                        self._cost(grid.get_path(start, goal, player_size, max_cost)), expected)
+
+            if hasattr(grid, 'get_paths'):
+                requests = [(self._free_cell(), goal, player_size) for _ in range(3)]
+                paths = grid.get_paths(requests, max_cost)
+                for (start, _, _), result in zip(requests, paths):
+                    self._check('get_paths {} -> {}'.format(start, goal), self._cost(result),
+                                self._search(fresh, start, goal, player_size))
+
+            field = grid.get_flow_field([goal], player_size, max_cost)
+            fresh_field = fresh.get_flow_field([goal], player_size, max_cost)
+            for coord in self._coords():
+                self._check('flow field {} -> {}'.format(coord, goal), field.get_cost(coord), fresh_field.get_cost(coord))
+
+        loaded = type(grid).from_snapshot(grid.snapshot())
+        start = self._free_cell()
+        goal = self._free_cell()
+        player_size = rnd.choice(player_sizes)
+        self._check('snapshot path {} -> {}'.format(start, goal),
+                    self._search(loaded, start, goal, player_size), self._search(fresh, start, goal, player_size))
+
+    def close(self):
+        for planner in self._planners:
+            planner.close()
+
+
+def check_large_player():
+    # A player larger than max_player_size crosses a corridor whose footprints reach further than
+    # the clearance map, then a cell at the far edge of its footprint becomes an obstacle.
+    size = 60
+    player_size = max_player_size + 2
+    start, goal = (5, 20), (45, 20)
+    obstacle = (25, 20 + player_size - 1)
+    walls = [(x, y) for x in range(size) for y in range(size) if x in (0, size - 1) or y in (0, size - 1)]
+
+    mismatches = []
+    for make_grid in (Grid, lambda: DenseGrid(size, size)):
+        grid = make_grid()
+        grid.set_cells_are_obstacles(walls)
+        grid.get_path(start, goal, player_size, 300)
+        grid.set_cell_is_obstacle(obstacle, True)
+
+        fresh = make_grid()
+        fresh.set_cells_are_obstacles(walls + [obstacle])
+        expected = fresh.search_path(start, goal, player_size, 300)[1]
+        for what, (_, cost) in (('search', grid.search_path(start, goal, player_size, 300)),
+                                ('cached path', grid.get_path(start, goal, player_size, 300))):
+            if abs(cost - expected) > 1e-6:
+                mismatches.append('{} large player {}: {} instead of {}'.format(
+                    type(grid).__name__, what, cost, expected))
+    return mismatches
+
+
+def run(edits, seed):
+    mismatches = check_large_player()
+    for mismatch in mismatches:
+        print(mismatch)
+    for make_grid in (Grid, lambda: DenseGrid(width, height), DistanceGrid):
+        checker = Checker(make_grid, seed)
+        for _ in range(edits):
+            checker.edit()
+            checker.check()
+        checker.close()
+
+        print('{}: {} edits, {} mismatches'.format(type(checker.grid).__name__, edits, len(checker.mismatches)))
+        for mismatch in checker.mismatches[:10]:
+            print('  ' + mismatch)
+        mismatches.extend(checker.mismatches)
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description='incremental grid updates against a rebuild')
+    parser.add_argument('--edits', type=int, default=200, help='obstacle changes per grid')
+    parser.add_argument('--seed', type=int, default=1, help='seed of the map and the changes')
+    arguments = parser.parse_args()
+
+    if run(arguments.edits, arguments.seed):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,17 @@
+import os
+
 import cocos
 import pyglet.window.mouse
 from cocos import batch
 from cocos import euclid
 
+from anyAngle import path_length, smooth_path
+from dStarLite import DStarLite
+from debugLayer import HeatmapCanvas
+from hierarchicalGrid import HierarchicalGrid
+from mapLoader import color_masks, mask_coords, tile_count
 from pathCanvas import PathCanvas
+from searchStats import SearchStats
 
 use_distance_grid = False
 if use_distance_grid:
@@ -16,6 +24,11 @@ else:
 director = cocos.director.director
 g_player_size = 1
 g_grid_size = 16
+g_map_image = 'assets/grid.png'
+# obstacles of the map image, rebuilt when the image is newer
+g_map_snapshot = 'assets/grid.snapshot'
+# longest path the hierarchy looks for once the planner found nothing within its cost of 50
+g_max_path_cost = 300
 
 
 class GridLayer(cocos.layer.Layer):
@@ -25,12 +38,16 @@ class GridLayer(cocos.layer.Layer):
         self.start_square = None
         self.end_square = None
 
-        bg = cocos.sprite.Sprite('assets/grid.png', anchor=(0, 0))
+        bg = cocos.sprite.Sprite(g_map_image, anchor=(0, 0))
         self.add(bg)
 
         # Canvas that draws the grid
         # self.add(GridCanvas(g_grid_size))
 
+        # Cells expanded by the last path search, shown while search stats are on
+        self.heatmap_canvas = HeatmapCanvas(g_grid_size)
+        self.add(self.heatmap_canvas)
+
         # Canvas to draw paths
         self.path_canvas = PathCanvas()
         self.add(self.path_canvas)
@@ -40,42 +57,72 @@ class GridLayer(cocos.layer.Layer):
         self.add(self.obstacles_batch_node)
         self.obstacle_squares = {}
 
-        # Grid used for path finding
-        self._grid = Grid()
         self.path_cost = 0
 
-        # Load obstacles from image
-        bg_texture_data = bg.image.get_image_data()
-        data = bg_texture_data.get_data('RGB', bg.width * 3)
-        valid_colors = [
-            [192, 192, 191],
-            [102, 112, 102],
-            [91, 91, 91],
-            [168, 168, 168],
-        ]
-
-        for x in range(g_grid_size / 2, bg.width, g_grid_size):
-            for y in range(g_grid_size / 2, bg.height, g_grid_size):
-                pos = (bg.width * y + x) * 3
-                rgb = map(ord, data[pos:pos + 3])
-                valid = False
-                limit = 2
-                for valid_color in valid_colors:
-                    if valid:
-                        break
-                    valid = True
-                    for i in range(0, 3):
-                        valid = valid and abs(valid_color[i] - rgb[i]) < limit
-
-                if not valid:
-                    self.set_grid_obstructed((x, y), True, False)
+        # Keeps the search to the end square between updates
+        self._planner = None
+
+        # Grid used for path finding
+        self._grid = None
+        if os.path.exists(g_map_snapshot) and \
+                os.path.getmtime(g_map_snapshot) >= os.path.getmtime(g_map_image):
+            try:
+                self._grid = Grid.load_snapshot(g_map_snapshot)
+            except ValueError:
+                # written by another version or broken, it is rebuilt from the image below
+                self._grid = None
+
+        if self._grid is not None:
+            obstacles = self._grid.obstacle_coords()
+        else:
+            # Load obstacles from image
+            self._grid = Grid()
+            bg_texture_data = bg.image.get_image_data()
+            data = bg_texture_data.get_data('RGB', bg.width * 3)
+            valid_colors = [
+                [192, 192, 191],
+                [102, 112, 102],
+                [91, 91, 91],
+                [168, 168, 168],
+            ]
+
+            # every tile that doesn't have a floor color is an obstacle
+            columns, rows, (valid_tiles,) = color_masks(data, bg.width, bg.height, g_grid_size, [valid_colors])
+            obstacles = mask_coords(valid_tiles, columns, value=0)
+            self._grid.set_cells_are_obstacles(obstacles)
+            self._grid.save_snapshot(g_map_snapshot)
+
+        for grid_pos in obstacles:
+            self.add_obstacle_sprite(grid_pos)
+
+        # Finds the paths across the map that are longer than the planner looks
+        self._hierarchy = HierarchicalGrid(
+            self._grid, tile_count(bg.width, g_grid_size), tile_count(bg.height, g_grid_size))
 
     def update_path(self):
-        path = self.get_start_to_end_path()
-        path = [self.grid_to_world(grid_pos) for grid_pos in path]
-        path = [(x + g_grid_size * g_player_size / 2.0,
-                 y + g_grid_size * g_player_size / 2.0) for x, y in path]
-        self.path_canvas.set_path(path)
+        stats = self._grid.stats
+        if stats is not None:
+            stats.heatmap.clear()
+
+        # only the turning points are left, centered on the player
+        offset = g_grid_size * g_player_size / 2.0
+        self.path_canvas.set_path([(x_cord * g_grid_size + offset, y_cord * g_grid_size + offset)
+                                   for x_cord, y_cord in self.get_start_to_end_path()])
+
+        if stats is not None:
+            self.heatmap_canvas.set_heatmap(stats.heatmap)
+
+    def toggle_search_stats(self):
+        if self._grid.stats is None:
+            self._grid.stats = SearchStats()
+        else:
+            self._grid.stats = None
+            self.heatmap_canvas.set_heatmap(None)
+        self.update_path()
+
+    def search_summary(self):
+        stats = self._grid.stats
+        return '' if stats is None else stats.summary()
 
     @staticmethod
     def world_to_grid(world_pos):
@@ -101,13 +148,7 @@ class GridLayer(cocos.layer.Layer):
         self._grid.set_cell_is_obstacle(grid_pos, is_obstructed)
 
         if is_obstructed:
-            obstacle = cocos.sprite.Sprite(
-                image='assets/white.png',
-                scale=g_grid_size
-            )
-            obstacle.position = self.grid_to_world(grid_pos)
-            self.obstacles_batch_node.add(obstacle)
-            self.obstacle_squares[grid_pos] = obstacle
+            self.add_obstacle_sprite(grid_pos)
         else:
             current_obstacle = self.obstacle_squares.get(grid_pos, None)
             self.obstacles_batch_node.remove(current_obstacle)
@@ -116,6 +157,15 @@ class GridLayer(cocos.layer.Layer):
         if update_path:
             self.update_path()
 
+    def add_obstacle_sprite(self, grid_pos):
+        obstacle = cocos.sprite.Sprite(
+            image='assets/white.png',
+            scale=g_grid_size
+        )
+        obstacle.position = self.grid_to_world(grid_pos)
+        self.obstacles_batch_node.add(obstacle)
+        self.obstacle_squares[grid_pos] = obstacle
+
     def toggle_grid_obstacle(self, position):
         position = self.get_world_inverse() * euclid.Point2(position[0], position[1])
         # Toggle this obstacle
@@ -164,8 +214,6 @@ class GridLayer(cocos.layer.Layer):
             self.start_square = None
             self.set_start_pos(start_pos)
 
-        self._grid.update_player_size()
-
     def update_state(self, state):
         if state == 'path':
             self.path_canvas.scale = 1
@@ -181,16 +229,47 @@ class GridLayer(cocos.layer.Layer):
         start_pos = self.world_to_grid(self.start_square.position)
         end_pos = self.world_to_grid(self.end_square.position)
 
-        path, cost = self._grid.get_path(
-            start=start_pos,
-            goal=end_pos,
-            player_size=g_player_size,
-            max_cost=50
-        )
+        # walled off goals are rejected before the planner or the hierarchy search for them
+        components = getattr(self._grid, 'components', None)
+        if components is not None and not components.can_reach(start_pos, end_pos, g_player_size):
+            self.path_cost = -1
+            return []
+
+        planner = self._planner
+        if planner is None or planner.goal != end_pos or planner.player_size != g_player_size:
+            if planner is not None:
+                planner.close()
+            planner = DStarLite(self._grid, start_pos, end_pos, g_player_size, max_cost=50)
+            self._planner = planner
+        elif planner.start != start_pos:
+            planner.move_start(start_pos)
+
+        path, cost = planner.get_path()
+        if not path:
+            path, cost = self.get_hierarchy_path(start_pos, end_pos)
+
+        # only keep the turning points
+        if path:
+            path = smooth_path(self._grid, path, g_player_size)
+            cost = path_length(path)
 
         self.path_cost = cost
         return path
 
+    def get_hierarchy_path(self, start_pos, end_pos):
+        # The grid's path cache keeps these until an obstacle change can affect them, so mouse
+        # updates that don't move the start or the end don't search again
+        path_cache = getattr(self._grid, 'path_cache', None)
+        key = (start_pos, end_pos, g_player_size, g_max_path_cost, 'hierarchy', False)
+        cached = None if path_cache is None else path_cache.get(key)
+        if cached is not None:
+            return cached
+
+        path, cost = self._hierarchy.get_path(start_pos, end_pos, g_player_size, g_max_path_cost)
+        if path_cache is not None:
+            path_cache.put(key, start_pos, end_pos, g_max_path_cost, path, cost)
+        return path, cost
+
 
 class MouseDisplay(cocos.layer.Layer):
     is_event_handler = True  #: enable director.window events
@@ -276,8 +355,10 @@ class MouseDisplay(cocos.layer.Layer):
             self.text.element.text = 'Mode: Edit Obstructions (left click to toggle grid obstruction). \'r\' to switch to path.'
         elif self.state == 'path':
             self.text.element.text = (
-                'Mode: Path cost: {cost} (left & right click to set start & end pos). \'e\' to switch to edit'.format(
-                    cost=self._grid.path_cost
+                'Mode: Path cost: {cost} (left & right click to set start & end pos). \'e\' to switch to edit, '
+                '\'h\' for search stats {summary}'.format(
+                    cost=self._grid.path_cost,
+                    summary=self._grid.search_summary()
                 )
             )
         else:
@@ -298,6 +379,8 @@ class MouseDisplay(cocos.layer.Layer):
         elif key == ord('f'):
             g_player_size = max(1, g_player_size - 1)
             self._grid.update_player_size()
+        elif key == ord('h'):
+            self._grid.toggle_search_stats()
 
         self.update_text()
 
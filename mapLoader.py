@@ -0,0 +1,139 @@
+# Turns a map image into grid masks. Every tile is sampled at its center pixel and compared with a
+# few sets of colors, all sets are checked in the same pass over the samples. numpy is used for the
+# sampling when it is installed.
+
+import struct
+import zlib
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def tile_count(size, tile_size):
+    # number of tile centers (tile_size / 2, tile_size * 1.5, ...) that fit in size pixels
+    half = tile_size // 2
+    return max((size - half + tile_size - 1) // tile_size, 0)
+
+
+def color_masks(data, width, height, tile_size, color_sets, limit=2):
+    # data holds width x height RGB pixels, rows from the bottom like pyglet returns them. Returns
+    # (columns, rows, masks) with one bytearray per color set, mask[row * columns + column] is 1
+    # where the center of the tile is within limit of one of the colors of the set on every channel.
+    columns = tile_count(width, tile_size)
+    rows = tile_count(height, tile_size)
+    half = tile_size // 2
+    if numpy is not None:
+        return columns, rows, _numpy_color_masks(data, width, height, tile_size, color_sets, limit)
+
+    pixels = bytearray(data)
+    samples = []
+    for y_cord in range(half, height, tile_size):
+        for x_cord in range(half, width, tile_size):
+            position = (width * y_cord + x_cord) * 3
+            samples.append(pixels[position:position + 3])
+
+    masks = []
+    for colors in color_sets:
+        mask = bytearray(len(samples))
+        for number, sample in enumerate(samples):
+            for color in colors:
+                if abs(color[0] - sample[0]) < limit and abs(color[1] - sample[1]) < limit and \
+                        abs(color[2] - sample[2]) < limit:
+                    mask[number] = 1
+                    break
+        masks.append(mask)
+    return columns, rows, masks
+
+
+def _numpy_color_masks(data, width, height, tile_size, color_sets, limit):
+    half = tile_size // 2
+    image = numpy.frombuffer(data, dtype=numpy.uint8).reshape(height, width, 3)
+    samples = image[half::tile_size, half::tile_size].astype(numpy.int16)
+
+    masks = []
+    for colors in color_sets:
+        matches = numpy.zeros(samples.shape[:2], dtype=bool)
+        for color in colors:
+            difference = numpy.abs(samples - numpy.asarray(color, dtype=numpy.int16))
+            matches |= (difference < limit).all(axis=2)
+        masks.append(bytearray(matches.astype(numpy.uint8).tobytes()))
+    return masks
+
+
+def mask_coords(mask, columns, value=1):
+    # grid coordinates of the tiles set to value in mask
+    return [(number % columns, number // columns) for number, tile in enumerate(mask) if tile == value]
+
+
+def read_png(path):
+    # (width, height, data) of an 8 bit RGB or RGBA png without loading pyglet, data is RGB with
+    # the rows from the bottom like color_masks takes it
+    with open(path, 'rb') as png_file:
+        png = png_file.read()
+    if png[:8] != b'\x89PNG\r\n\x1a\n':
+        raise ValueError('{} is not a png'.format(path))
+
+    offset = 8
+    compressed = []
+    while offset < len(png):
+        length, tag = struct.unpack('>I4s', png[offset:offset + 8])
+        chunk = png[offset + 8:offset + 8 + length]
+        offset += length + 12
+        if tag == b'IHDR':
+            width, height, bit_depth, color_type, _, _, interlace = struct.unpack('>IIBBBBB', chunk)
+        elif tag == b'IDAT':
+            compressed.append(chunk)
+        elif tag == b'IEND':
+            break
+    if bit_depth != 8 or color_type not in (2, 6) or interlace:
+        raise ValueError('{} is not an 8 bit RGB or RGBA png without interlacing'.format(path))
+
+    channels = 3 if color_type == 2 else 4
+    stride = width * channels
+    raw = bytearray(zlib.decompress(b''.join(compressed)))
+    rows = []
+    previous = bytearray(stride)
+    for y_cord in range(height):
+        start = y_cord * (stride + 1)
+        row = _unfilter(raw[start], raw[start + 1:start + 1 + stride], previous, channels)
+        rows.append(row)
+        previous = row
+
+    data = bytearray()
+    for row in reversed(rows):
+        if channels == 4:
+            del row[3::4]
+        data += row
+    return width, height, bytes(data)
+
+
+def _unfilter(filter_type, row, previous, channels):
+    # undoes the png filter of one row, see the png specification section 9
+    if filter_type == 0:
+        return row
+    if filter_type == 2:
+        return bytearray((value + above) & 0xff for value, above in zip(row, previous))
+
+    for number in range(len(row)):
+        left = row[number - channels] if number >= channels else 0
+        if filter_type == 1:
+            row[number] = (row[number] + left) & 0xff
+        elif filter_type == 3:
+            row[number] = (row[number] + (left + previous[number]) // 2) & 0xff
+        elif filter_type == 4:
+            above = previous[number]
+            above_left = previous[number - channels] if number >= channels else 0
+            estimate = left + above - above_left
+            distances = abs(estimate - left), abs(estimate - above), abs(estimate - above_left)
+            if distances[0] <= distances[1] and distances[0] <= distances[2]:
+                predictor = left
+            elif distances[1] <= distances[2]:
+                predictor = above
+            else:
+                predictor = above_left
+            row[number] = (row[number] + predictor) & 0xff
+        else:
+            raise ValueError('unknown png filter {}'.format(filter_type))
+    return row
@@ -0,0 +1,192 @@
+# Binary map snapshots so a map doesn't have to be rebuilt from its image on every start.
+#
+# A snapshot is a header followed by tagged sections:
+#   header   '<4sBBBBIiiii4x' magic, version, kind, byte order (0 little, 1 big), size of the
+#            int items, section count, x/y origin, width, height
+#   section  '<4siI' tag, parameter, byte length, then the data padded to 8 bytes
+# OBST is the obstacle bitset of the header box (bit i of the row major cells, lowest bit first).
+# Dense grid snapshots also have OBSB, the same obstacles with one byte per cell, which is read
+# instead of OBST. The other sections hold derived data that would otherwise be recomputed on load:
+# CLRC clearance bytes, DIST the squared distance field (doubles) and NEAR its closest obstacles
+# (ints), both with their own box, and COMP the component labels (ints) for the player size in the
+# parameter. Typed sections are stored in the byte order of the machine that wrote them and swapped
+# on load when that differs.
+#
+# Files are read through mmap with copy on write access. The OBSB and CLRC sections are used in
+# place, so processes that load the same snapshot share their pages until they change something,
+# the other sections are unpacked or copied into arrays.
+
+import mmap
+import struct
+import sys
+from array import array
+
+magic = b'GWSN'
+version = 2
+GRID, DENSE_GRID, DISTANCE_GRID = range(3)
+
+_header = struct.Struct('<4sBBBBIiiii4x')
+_section = struct.Struct('<4siI')
+_box = struct.Struct('<iiii')
+_components = struct.Struct('<iiiii')
+
+# _bit_tables[bit] maps a byte to the value of that bit
+_bit_tables = [bytes(bytearray((value >> bit) & 1 for value in range(256))) for bit in range(8)]
+
+
+def pack_bits(cells):
+    # byte per cell to bitset
+    bits = bytearray((len(cells) + 7) // 8)
+    for index in range(len(cells)):
+        if cells[index]:
+            bits[index >> 3] |= 1 << (index & 7)
+    return bits
+
+
+def unpack_bits(bits, count):
+    # bitset to a bytearray with one byte per cell, one translate per bit position
+    cells = bytearray(len(bits) * 8)
+    bits = bytes(bits)
+    for bit in range(8):
+        cells[bit::8] = bits.translate(_bit_tables[bit])
+    del cells[count:]
+    return cells
+
+
+_byte_order = 0 if sys.byteorder == 'little' else 1
+_int_size = array('i').itemsize
+
+
+def _typed(typecode, data, swap):
+    values = array(typecode)
+    if hasattr(values, 'frombytes'):
+        values.frombytes(bytes(data))
+    else:
+        values.fromstring(bytes(data))
+    if swap:
+        values.byteswap()
+    return values
+
+
+def _to_bytes(values):
+    return values.tobytes() if hasattr(values, 'tobytes') else values.tostring()
+
+
+class ComponentLabels:
+    # labels of a ComponentIndex, every label is the root of its component
+    def __init__(self, player_size, origin, width, height, outside, labels):
+        self.player_size = player_size
+        self.origin = origin
+        self.width = width
+        self.height = height
+        self.outside = outside
+        self.labels = labels
+
+
+class Snapshot:
+    def __init__(self, kind, origin, width, height, obstacles):
+        self.kind = kind
+        self.origin = origin
+        self.width = width
+        self.height = height
+        # one byte per cell of the box, nonzero for obstacles
+        self.obstacles = obstacles
+
+        # optional derived data, None when it was not saved
+        self.clearance = None
+        self.distance_box = None
+        self.distance_field = None
+        self.nearest = None
+        self.components = []
+
+    def obstacle_coords(self):
+        x_origin, y_origin = self.origin
+        width = self.width
+        # obstacles read in place are a memoryview, which can't be searched
+        obstacles = self.obstacles if hasattr(self.obstacles, 'find') else bytes(self.obstacles)
+        coords = []
+        index = obstacles.find(b'\x01')
+        while index != -1:
+            coords.append((x_origin + index % width, y_origin + index // width))
+            index = obstacles.find(b'\x01', index + 1)
+        return coords
+
+
+def write_snapshot(path, snapshot):
+    sections = [(b'OBST', 0, pack_bits(snapshot.obstacles))]
+    if snapshot.kind == DENSE_GRID:
+        sections.append((b'OBSB', 0, bytes(snapshot.obstacles)))
+    if snapshot.clearance is not None:
+        sections.append((b'CLRC', 0, bytes(snapshot.clearance)))
+    if snapshot.distance_field is not None:
+        box = _box.pack(*snapshot.distance_box)
+        sections.append((b'DIST', 0, box + _to_bytes(snapshot.distance_field)))
+        sections.append((b'NEAR', 0, box + _to_bytes(snapshot.nearest)))
+    for components in snapshot.components:
+        data = _components.pack(components.origin[0], components.origin[1], components.width,
+                                components.height, components.outside)
+        sections.append((b'COMP', components.player_size, data + _to_bytes(components.labels)))
+
+    with open(path, 'wb') as snapshot_file:
+        snapshot_file.write(_header.pack(magic, version, snapshot.kind, _byte_order, _int_size, len(sections),
+                                         snapshot.origin[0], snapshot.origin[1], snapshot.width, snapshot.height))
+        for tag, parameter, data in sections:
+            snapshot_file.write(_section.pack(tag, parameter, len(data)))
+            snapshot_file.write(data)
+            snapshot_file.write(b'\0' * (-len(data) % 8))
+
+
+def read_snapshot(path):
+    with open(path, 'rb') as snapshot_file:
+        mapped = mmap.mmap(snapshot_file.fileno(), 0, access=mmap.ACCESS_COPY)
+    view = memoryview(mapped)
+
+    if len(mapped) < _header.size:
+        raise ValueError('{} is not a version {} map snapshot'.format(path, version))
+    file_magic, file_version, kind, byte_order, int_size, section_count, x_origin, y_origin, width, height = \
+        _header.unpack_from(mapped, 0)
+    if file_magic != magic or file_version != version:
+        raise ValueError('{} is not a version {} map snapshot'.format(path, version))
+    if int_size != _int_size:
+        raise ValueError('{} has {} byte ints, this platform uses {}'.format(path, int_size, _int_size))
+    swap = byte_order != _byte_order
+
+    snapshot = Snapshot(kind, (x_origin, y_origin), width, height, None)
+    obstacle_bits = None
+    offset = _header.size
+    for _ in range(section_count):
+        if offset + _section.size > len(mapped):
+            raise ValueError('{} is truncated'.format(path))
+        tag, parameter, length = _section.unpack_from(mapped, offset)
+        start = offset + _section.size
+        if start + length > len(mapped):
+            raise ValueError('{} is truncated'.format(path))
+        data = view[start:start + length]
+        offset = start + length + (-length % 8)
+
+        if tag == b'OBST':
+            if length * 8 < width * height:
+                raise ValueError('{} is truncated'.format(path))
+            obstacle_bits = data
+        elif tag == b'OBSB':
+            if length < width * height:
+                raise ValueError('{} is truncated'.format(path))
+            snapshot.obstacles = data[:width * height]
+        elif tag == b'CLRC':
+            snapshot.clearance = data
+        elif tag == b'DIST':
+            snapshot.distance_box = _box.unpack_from(mapped, start)
+            snapshot.distance_field = _typed('d', data[_box.size:], swap)
+        elif tag == b'NEAR':
+            snapshot.nearest = _typed('i', data[_box.size:], swap)
+        elif tag == b'COMP':
+            x_labels, y_labels, labels_width, labels_height, outside = _components.unpack_from(mapped, start)
+            snapshot.components.append(ComponentLabels(
+                parameter, (x_labels, y_labels), labels_width, labels_height, outside,
+                _typed('i', data[_components.size:], swap)))
+
+    if snapshot.obstacles is None:
+        if obstacle_bits is None:
+            raise ValueError('{} has no obstacle section'.format(path))
+        snapshot.obstacles = unpack_bits(obstacle_bits, width * height)
+    return snapshot
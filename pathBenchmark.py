@@ -0,0 +1,65 @@
+# Compares a loop over get_path with one get_paths call for many units walking to a few goals
+# Run with: python pathBenchmark.py
+
+import random
+import timeit
+
+from grid import DenseGrid, Grid
+
+width = 128
+height = 96
+obstacle_density = 0.1
+unit_count = 200
+goal_count = 4
+player_sizes = (1, 2, 3)
+max_cost = 100
+seed = 1
+
+
+def make_grids():
+    rnd = random.Random(seed)
+    obstacles = [(x, y) for x in range(width) for y in range(height) if rnd.random() < obstacle_density]
+
+    grids = []
+    for grid in (Grid(), DenseGrid(width, height)):
+        for coord in obstacles:
+            grid.set_cell_is_obstacle(coord, True)
+        grids.append(grid)
+    return grids
+
+
+def make_requests(grid):
+    rnd = random.Random(seed)
+
+    def free_cell():
+        while True:
+            coord = (rnd.randrange(width), rnd.randrange(height))
+            if not grid.is_obstacle_at(coord):
+                return coord
+
+    goals = [free_cell() for _ in range(goal_count)]
+    return [(free_cell(), rnd.choice(goals), rnd.choice(player_sizes)) for _ in range(unit_count)]
+
+
+def run():
+    for grid in make_grids():
+        requests = make_requests(grid)
+
+        started = timeit.default_timer()
+        single = [grid.get_path(start, goal, player_size, max_cost=max_cost)
+                  for start, goal, player_size in requests]
+        single_time = timeit.default_timer() - started
+
+        started = timeit.default_timer()
+        batch = grid.get_paths(requests, max_cost=max_cost)
+        batch_time = timeit.default_timer() - started
+
+        found = sum(1 for path, _ in batch if path)
+        same = all(bool(a[0]) == bool(b[0]) and abs(a[1] - b[1]) < 1e-6 for a, b in zip(single, batch) if a[0])
+        print('{}: {} requests, {} found, get_path loop {:.3f}s, get_paths {:.3f}s, {:.1f}x, same costs: {}'.format(
+            grid.__class__.__name__, len(requests), found, single_time, batch_time,
+            single_time / max(batch_time, 1e-9), same))
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,117 @@
+# Compact paths, the points of a path are kept in one flat typed array (x0, y0, x1, y1, ...) instead
+# of a list of tuples. Grid paths can also be stored as runs of the same step.
+
+from array import array
+
+from flowField import directions
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+
+def new_path(compact=False):
+    # empty path for the searches to append to, a PathBuffer or a list of tuples
+    return PathBuffer() if compact else []
+
+
+class PathBuffer:
+    def __init__(self, coords=None, typecode='i'):
+        if coords is None:
+            coords = array(typecode)
+        self.coords = coords
+
+    @classmethod
+    def from_path(cls, path):
+        coords = array('i')
+        for x_cord, y_cord in path:
+            coords.append(x_cord)
+            coords.append(y_cord)
+        return cls(coords)
+
+    @classmethod
+    def from_run_lengths(cls, start, runs):
+        # inverse of run_lengths
+        coords = array('i', start)
+        x_cord, y_cord = start
+        for number in range(0, len(runs), 2):
+            dx, dy = directions[runs[number]]
+            for _ in range(runs[number + 1]):
+                x_cord += dx
+                y_cord += dy
+                coords.append(x_cord)
+                coords.append(y_cord)
+        return cls(coords)
+
+    def append(self, coord):
+        self.coords.extend(coord)
+
+    def __copy__(self):
+        return PathBuffer(self.coords[:], self.coords.typecode)
+
+    def __len__(self):
+        return len(self.coords) // 2
+
+    def __getitem__(self, number):
+        if number < 0:
+            number += len(self)
+        if not 0 <= number < len(self):
+            raise IndexError('path index out of range')
+        return self.coords[2 * number], self.coords[2 * number + 1]
+
+    def __iter__(self):
+        coords = self.coords
+        for number in range(0, len(coords), 2):
+            yield coords[number], coords[number + 1]
+
+    def __eq__(self, other):
+        return isinstance(other, PathBuffer) and self.coords == other.coords
+
+    def __ne__(self, other):
+        return not self == other
+
+    def reverse(self):
+        # reverses the points, the x and y of every point stay in order
+        coords = self.coords
+        x_coords = coords[-2::-2]
+        y_coords = coords[-1::-2]
+        coords[0::2] = x_coords
+        coords[1::2] = y_coords
+
+    def to_world(self, cell_size, offset=(0, 0)):
+        # PathBuffer of world positions (floats), cell * cell_size + offset
+        x_offset, y_offset = offset
+        coords = self.coords
+        world = array('d', coords)
+        world[0::2] = array('d', [x_cord * cell_size + x_offset for x_cord in coords[0::2]])
+        world[1::2] = array('d', [y_cord * cell_size + y_offset for y_cord in coords[1::2]])
+        return PathBuffer(world, 'd')
+
+    def as_array(self):
+        # the points as a numpy N x 2 array sharing memory with the buffer
+        if numpy is None:
+            raise ImportError('PathBuffer.as_array needs numpy')
+        dtype = numpy.int32 if self.coords.typecode == 'i' else numpy.float64
+        return numpy.frombuffer(self.coords, dtype=dtype).reshape(-1, 2)
+
+    def to_world_array(self, cell_size, offset=(0, 0)):
+        # to_world for many points at once with numpy, returns an N x 2 float array
+        return self.as_array() * float(cell_size) + numpy.asarray(offset, dtype=numpy.float64)
+
+    def run_lengths(self):
+        # array('B') of (step, count) pairs, step is an index in flowField.directions. Only paths
+        # made of single grid steps can be stored like this.
+        runs = array('B')
+        coords = self.coords
+        for number in range(2, len(coords), 2):
+            step = (coords[number] - coords[number - 2], coords[number + 1] - coords[number - 1])
+            if step not in directions:
+                raise ValueError('{} is not a single grid step'.format(step))
+            step = directions.index(step)
+            if runs and runs[-2] == step and runs[-1] < 255:
+                runs[-1] += 1
+            else:
+                runs.append(step)
+                runs.append(1)
+        return runs
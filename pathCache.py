@@ -0,0 +1,107 @@
+# Remembers get_path results so the same query is not searched again while the map around it
+# stays the same. Entries are only dropped for obstacle changes that can change their answer.
+
+import math
+from collections import OrderedDict
+from copy import copy
+
+from anyAngle import line_cells
+
+# results kept before the least recently used one is dropped
+max_cached_paths = 64
+
+
+def _distance_to_area(coord, area):
+    # euclidean distance from coord to the closest cell of area (x_min, y_min, x_max, y_max)
+    dx = max(area[0] - coord[0], 0, coord[0] - area[2])
+    dy = max(area[1] - coord[1], 0, coord[1] - area[3])
+    return math.hypot(dx, dy)
+
+
+class CachedPath:
+    def __init__(self, start, goal, max_cost, path, cost):
+        self.start = start
+        self.goal = goal
+        self.max_cost = max_cost
+        self.path = path
+        self.cost = cost
+
+        if len(path):
+            self.area = (min(coord[0] for coord in path), min(coord[1] for coord in path),
+                         max(coord[0] for coord in path), max(coord[1] for coord in path))
+        else:
+            self.area = None
+
+    def cells(self):
+        # any-angle paths only keep their turning points, the cells in between count as well
+        previous = None
+        for coord in self.path:
+            if previous is None:
+                yield coord
+            else:
+                for cell in line_cells(previous, coord)[1:]:
+                    yield cell
+            previous = coord
+
+    def is_affected_by(self, coord, is_obstacle, area):
+        # area is the box of cells whose neighbors changed with coord
+        if coord == self.start or coord == self.goal:
+            return True
+
+        if is_obstacle:
+            # a new obstacle only removes moves, an unchanged path stays the shortest one
+            if self.area is None:
+                return False
+            if area[0] > self.area[2] or area[2] < self.area[0] or \
+                    area[1] > self.area[3] or area[3] < self.area[1]:
+                return False
+            for x_cord, y_cord in self.cells():
+                if area[0] <= x_cord <= area[2] and area[1] <= y_cord <= area[3]:
+                    return True
+            return False
+
+        # A removed obstacle only matters if a path through area can be cheaper than the cached
+        # one. Every step costs at least its straight line distance, which bounds such a path.
+        limit = self.cost if len(self.path) else self.max_cost
+        moved_area = (area[0] - 1, area[1] - 1, area[2] + 1, area[3] + 1)
+        return _distance_to_area(self.start, moved_area) + _distance_to_area(self.goal, moved_area) < limit
+
+
+class PathCache:
+    def __init__(self, grid):
+        self._grid = grid
+        self._paths = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        grid.add_obstacle_listener(self._obstacle_changed)
+
+    def __len__(self):
+        return len(self._paths)
+
+    def get(self, key):
+        # (path, cost) for key or None, the path is a copy the caller may change. Paths are kept
+        # the way they were put, a list of tuples or a PathBuffer.
+        cached = self._paths.pop(key, None)
+        if cached is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._paths[key] = cached
+        return copy(cached.path), cached.cost
+
+    def put(self, key, start, goal, max_cost, path, cost):
+        self._paths.pop(key, None)
+        if len(self._paths) >= max_cached_paths:
+            self._paths.popitem(last=False)
+        self._paths[key] = CachedPath(start, goal, max_cost, copy(path), cost)
+
+    def clear(self):
+        self._paths.clear()
+
+    def _obstacle_changed(self, coord, is_obstacle):
+        area = self._grid.neighbor_influence(coord)
+        for key, cached in list(self._paths.items()):
+            if cached.is_affected_by(coord, is_obstacle, area):
+                del self._paths[key]
@@ -18,6 +18,7 @@ class PathCanvas(Canvas):
         line_color = (255, 255, 255, 255)
         self.set_color(line_color)
 
-        self.move_to(path[0])
-        for point in path[1:]:
+        points = iter(path)
+        self.move_to(next(points))
+        for point in points:
             self.line_to(point)
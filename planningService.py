@@ -0,0 +1,128 @@
+# Plans paths in worker processes so long searches don't hold up the caller. Workers load the grid
+# from a map snapshot, which is mmapped, so the obstacles are never pickled per request and dense
+# grids share their obstacle and clearance bytes between the workers. Obstacle changes on the grid
+# are recorded as a compact edit log of (x, y, is_obstacle) triples that is appended to a file next
+# to the snapshot when a batch is submitted. A batch only carries the length of the log, workers
+# read the part they have not seen yet. Once the log gets long a new snapshot is written on the
+# next submit and the log starts over.
+
+import os
+import shutil
+import tempfile
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+# queries sent to a worker in one go
+batch_size = 64
+
+# edits kept in the log before a new snapshot is written
+max_logged_edits = 4096
+
+# grid of this worker process, see _plan
+_worker_grid = None
+_worker_generation = None
+_worker_applied = 0
+
+
+def _apply_edits(grid, edits):
+    # only the last state of every cell matters, so the edits go in as two bulk changes
+    state = {}
+    for number in range(0, len(edits), 3):
+        state[(edits[number], edits[number + 1])] = edits[number + 2] != 0
+    grid.set_cells_are_obstacles([coord for coord, is_obstacle in state.items() if not is_obstacle], False)
+    grid.set_cells_are_obstacles([coord for coord, is_obstacle in state.items() if is_obstacle], True)
+
+
+def _read_edits(edits_path, first, count):
+    # items first to count of the edit log file
+    edits = array('i')
+    with open(edits_path, 'rb') as edits_file:
+        edits_file.seek(first * edits.itemsize)
+        edits.fromfile(edits_file, count - first)
+    return edits
+
+
+def _plan(grid_class, generation, snapshot_path, edits_path, edit_count, queries, max_cost, algorithm, compact):
+    global _worker_grid, _worker_generation, _worker_applied
+    if _worker_generation != generation:
+        _worker_grid = grid_class.load_snapshot(snapshot_path)
+        _worker_generation = generation
+        _worker_applied = 0
+    if edit_count > _worker_applied:
+        _apply_edits(_worker_grid, _read_edits(edits_path, _worker_applied, edit_count))
+        _worker_applied = edit_count
+
+    grid = _worker_grid
+    if algorithm == 'astar' and hasattr(grid, 'get_paths'):
+        return grid.get_paths(queries, max_cost, compact)
+    return [grid.get_path(start, goal, player_size, max_cost, algorithm, compact)
+            for start, goal, player_size in queries]
+
+
+class PlanningService:
+    def __init__(self, grid, workers=None, snapshot_dir=None):
+        # grid stays the one that is edited, workers follow its obstacle changes
+        self._grid = grid
+        self._executor = ProcessPoolExecutor(workers)
+        self._own_dir = snapshot_dir is None
+        self._snapshot_dir = tempfile.mkdtemp(prefix='gridWorld') if snapshot_dir is None else snapshot_dir
+
+        self._generation = -1
+        self._snapshot_path = None
+        self._edits_path = None
+        # edits of this generation, the first _saved_edits items are in the file
+        self._edits = array('i')
+        self._saved_edits = 0
+        self._write_snapshot()
+
+        grid.add_obstacle_listener(self._obstacle_changed)
+
+    def _write_snapshot(self):
+        self._generation += 1
+        self._snapshot_path = os.path.join(self._snapshot_dir, 'map{}.snapshot'.format(self._generation))
+        self._edits_path = os.path.join(self._snapshot_dir, 'map{}.edits'.format(self._generation))
+        self._grid.save_snapshot(self._snapshot_path)
+        self._edits = array('i')
+        self._saved_edits = 0
+
+    def _save_edits(self):
+        # the grid already has all changes, a new snapshot holds them once the log is long
+        if len(self._edits) >= 3 * max_logged_edits:
+            self._write_snapshot()
+        elif len(self._edits) > self._saved_edits:
+            with open(self._edits_path, 'ab') as edits_file:
+                self._edits[self._saved_edits:].tofile(edits_file)
+            self._saved_edits = len(self._edits)
+
+    def _obstacle_changed(self, coord, is_obstacle):
+        self._edits.extend((coord[0], coord[1], 1 if is_obstacle else 0))
+
+    def submit(self, queries, max_cost=50, algorithm='astar', compact=False):
+        # Futures for a list of (start, goal, player_size) queries, one per batch_size of them in
+        # order. Each future gives a list of (path, cost) like Grid.get_path returns them.
+        self._save_edits()
+        futures = []
+        for number in range(0, len(queries), batch_size):
+            futures.append(self._executor.submit(
+                _plan, type(self._grid), self._generation, self._snapshot_path, self._edits_path,
+                self._saved_edits, queries[number:number + batch_size], max_cost, algorithm, compact))
+        return futures
+
+    def get_paths(self, queries, max_cost=50, algorithm='astar', compact=False):
+        # submit and wait, the results are in the same order as queries
+        results = []
+        for future in self.submit(queries, max_cost, algorithm, compact):
+            results.extend(future.result())
+        return results
+
+    def close(self):
+        self._grid.remove_obstacle_listener(self._obstacle_changed)
+        self._executor.shutdown()
+        if self._own_dir:
+            shutil.rmtree(self._snapshot_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
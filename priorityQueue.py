@@ -0,0 +1,94 @@
+# Open list shared by the path searches. It is an indexed binary heap: every item is queued at
+# most once, putting an item that is already queued moves it to its new priority (decrease key)
+# and items with equal priority are popped in the order they were put.
+
+
+class PriorityQueue:
+    def __init__(self):
+        self.elements = []
+        self._positions = {}
+        self._counter = 0
+
+    def __len__(self):
+        return len(self.elements)
+
+    def __contains__(self, item):
+        return item in self._positions
+
+    def empty(self):
+        return len(self.elements) == 0
+
+    def put(self, item, priority):
+        self._counter += 1
+        entry = [priority, self._counter, item]
+        position = self._positions.get(item, None)
+        if position is None:
+            self.elements.append(entry)
+            self._sift_up(len(self.elements) - 1)
+        else:
+            old_entry = self.elements[position]
+            self.elements[position] = entry
+            if entry < old_entry:
+                self._sift_up(position)
+            else:
+                self._sift_down(position)
+
+    def get(self):
+        elements = self.elements
+        last = elements.pop()
+        if elements:
+            top = elements[0]
+            elements[0] = last
+            self._sift_down(0)
+        else:
+            top = last
+        del self._positions[top[2]]
+        return top[2]
+
+    def top_priority(self):
+        return self.elements[0][0]
+
+    def remove(self, item):
+        elements = self.elements
+        position = self._positions.pop(item)
+        last = elements.pop()
+        if position < len(elements):
+            elements[position] = last
+            self._sift_up(position)
+            self._sift_down(self._positions[last[2]])
+
+    def _sift_up(self, position):
+        elements = self.elements
+        positions = self._positions
+        entry = elements[position]
+        while position > 0:
+            parent_position = (position - 1) >> 1
+            parent = elements[parent_position]
+            if not entry < parent:
+                break
+            elements[position] = parent
+            positions[parent[2]] = position
+            position = parent_position
+        elements[position] = entry
+        positions[entry[2]] = position
+
+    def _sift_down(self, position):
+        elements = self.elements
+        positions = self._positions
+        size = len(elements)
+        entry = elements[position]
+        while True:
+            child_position = 2 * position + 1
+            if child_position >= size:
+                break
+            right_position = child_position + 1
+            if right_position < size and elements[right_position] < elements[child_position]:
+                child_position = right_position
+            child = elements[child_position]
+            if not child < entry:
+                break
+            elements[position] = child
+            positions[child[2]] = position
+            position = child_position
+        elements[position] = entry
+        positions[entry[2]] = position
@@ -0,0 +1,130 @@
+# Optional counters for the path searches. Grids search without any while their stats is None,
+# with grid.stats = SearchStats() every query records what it did: the searches count the cells
+# they expand and push, the neighbor cache misses and the footprint checks, and every query
+# times its phases. Besides the searches of the grids that covers D* Lite, every step of a time
+# sliced search, the hierarchy and flow field builds. The last max_recorded_queries queries are
+# kept and everything is also summed in total. The heatmap counts how often every cell was
+# expanded, for debugLayer.HeatmapCanvas.
+
+from collections import deque
+from timeit import default_timer
+
+max_recorded_queries = 256
+
+
+class QueryStats:
+    def __init__(self, start=None, goal=None, player_size=None, algorithm=None):
+        self.start = start
+        self.goal = goal
+        self.player_size = player_size
+        self.algorithm = algorithm
+        self.cost = None
+
+        self.expanded = 0
+        # expansions of a cell that was expanded before in the same query. The open list moves
+        # queued cells instead of adding them again, so there are no stale entries to pop.
+        self.reexpanded = 0
+        self.pushes = 0
+        self.neighbor_lookups = 0
+        self.neighbor_cache_misses = 0
+        self.square_checks = 0
+
+        # seconds spent per phase
+        self.timings = {}
+
+    @property
+    def neighbor_cache_hits(self):
+        return self.neighbor_lookups - self.neighbor_cache_misses
+
+    def add(self, other):
+        self.expanded += other.expanded
+        self.reexpanded += other.reexpanded
+        self.pushes += other.pushes
+        self.neighbor_lookups += other.neighbor_lookups
+        self.neighbor_cache_misses += other.neighbor_cache_misses
+        self.square_checks += other.square_checks
+        for phase, seconds in other.timings.items():
+            self.timings[phase] = self.timings.get(phase, 0.0) + seconds
+
+    def as_dict(self):
+        return {
+            'start': self.start,
+            'goal': self.goal,
+            'player_size': self.player_size,
+            'algorithm': self.algorithm,
+            'cost': self.cost,
+            'expanded': self.expanded,
+            'reexpanded': self.reexpanded,
+            'pushes': self.pushes,
+            'neighbor_cache_hits': self.neighbor_cache_hits,
+            'neighbor_cache_misses': self.neighbor_cache_misses,
+            'square_checks': self.square_checks,
+            'timings': dict(self.timings),
+        }
+
+
+class SearchStats:
+    def __init__(self, heatmap=True):
+        self.total = QueryStats()
+        self.queries = deque(maxlen=max_recorded_queries)
+        # coord -> times expanded, None when not kept
+        self.heatmap = {} if heatmap else None
+
+        # counters of the query that is running, work done outside of a query lands in a record
+        # that is never kept
+        self.current = QueryStats()
+        self._expanded_cells = set()
+        self._lap_started = default_timer()
+
+    def begin_query(self, start, goal, player_size, algorithm):
+        self.current = QueryStats(start, goal, player_size, algorithm)
+        self._expanded_cells = set()
+        self._lap_started = default_timer()
+
+    def lap(self, phase):
+        # adds the time since the query began or the last lap to phase
+        now = default_timer()
+        timings = self.current.timings
+        timings[phase] = timings.get(phase, 0.0) + now - self._lap_started
+        self._lap_started = now
+
+    def end_query(self, cost, phase=None):
+        # phase gets the time since the last lap
+        if phase is not None:
+            self.lap(phase)
+        current = self.current
+        current.cost = cost
+        self.queries.append(current)
+        self.total.add(current)
+        self.current = QueryStats()
+        self._expanded_cells = set()
+
+    def expand(self, coord):
+        current = self.current
+        current.expanded += 1
+        if coord in self._expanded_cells:
+            current.reexpanded += 1
+        else:
+            self._expanded_cells.add(coord)
+        if self.heatmap is not None:
+            self.heatmap[coord] = self.heatmap.get(coord, 0) + 1
+
+    def push(self):
+        self.current.pushes += 1
+
+    def clear(self):
+        self.total = QueryStats()
+        self.queries.clear()
+        if self.heatmap is not None:
+            self.heatmap.clear()
+
+    def summary(self):
+        # one line for the last query
+        if not self.queries:
+            return 'no queries'
+        query = self.queries[-1]
+        timings = ', '.join('{} {:.2f} ms'.format(phase, 1000 * seconds)
+                            for phase, seconds in sorted(query.timings.items()))
+        return '{} expanded ({} again), {} pushes, neighbor cache {}/{}, {} square checks, {}'.format(
+            query.expanded, query.reexpanded, query.pushes, query.neighbor_cache_hits, query.neighbor_lookups,
+            query.square_checks, timings)
@@ -0,0 +1,169 @@
+# A* that runs a slice at a time, so a frame or a server tick can advance many searches without
+# going over its budget. Every step expands at most a number of cells or runs for at most a time,
+# in between the search keeps its open list. The cell closest to the goal seen so far gives a
+# partial path while the search is still running.
+#
+# With cocos: director schedules a function that calls step_searches(searches, 0.004) every frame.
+# With asyncio: for _ in search.slices(max_time=0.001): await asyncio.sleep(0)
+
+import math
+from timeit import default_timer
+
+from heuristics import movement_heuristic
+from priorityQueue import PriorityQueue
+
+
+class TimeSlicedSearch:
+    def __init__(self, grid, start, goal, player_size, max_cost=50):
+        self._grid = grid
+        self.start = start
+        self.goal = goal
+        self.player_size = player_size
+        self.max_cost = max_cost
+        self._heuristic = movement_heuristic(player_size)
+
+        # cells expanded over all steps, restarts included
+        self.expanded = 0
+
+        self._restart()
+        grid.add_obstacle_listener(self._obstacle_changed)
+
+    def close(self):
+        # stop listening to the grid
+        self._grid.remove_obstacle_listener(self._obstacle_changed)
+
+    def _restart(self):
+        self._stale = False
+        self._done = False
+        self._found = False
+        self._open = PriorityQueue()
+        self._came_from = {self.start: None}
+        self._cost = {self.start: 0}
+        self._closest = self.start
+        self._closest_estimate = self._heuristic(self.goal, self.start)
+
+        grid = self._grid
+        components = getattr(grid, 'components', None)
+        if grid.get_cell(self.start).is_obstacle or grid.get_cell(self.goal).is_obstacle or \
+                (components is not None and not components.can_reach(self.start, self.goal, self.player_size)):
+            self._done = True
+            return
+
+        self._open.put(self.start, (0, 0))
+
+    def _obstacle_changed(self, coord, is_obstacle):
+        # the cells searched so far may have changed, the search starts over on the next step
+        self._stale = True
+
+    @property
+    def done(self):
+        return self._done and not self._stale
+
+    @property
+    def found(self):
+        return self._found and not self._stale
+
+    def step(self, max_nodes=None, max_time=None):
+        # Expands up to max_nodes cells or for up to max_time seconds, whichever ends first, at
+        # least one cell is expanded. Returns True once the search is done.
+        stats = getattr(self._grid, 'stats', None)
+        if stats is None:
+            return self._step(max_nodes, max_time, None)
+
+        # every step is a query of its own, with a cost once the search is done
+        stats.begin_query(self.start, self.goal, self.player_size, 'sliced')
+        done = self._step(max_nodes, max_time, stats)
+        stats.end_query(self.result()[1] if done else None, 'search')
+        return done
+
+    def _step(self, max_nodes, max_time, stats):
+        if self._stale:
+            self._restart()
+        if self._done:
+            return True
+
+        deadline = None if max_time is None else default_timer() + max_time
+        grid = self._grid
+        goal = self.goal
+        player_size = self.player_size
+        max_cost = self.max_cost
+        heuristic = self._heuristic
+        frontier = self._open
+        came_from = self._came_from
+        cost_so_far = self._cost
+
+        expanded = 0
+        while not frontier.empty():
+            if expanded and ((max_nodes is not None and expanded >= max_nodes) or
+                             (deadline is not None and default_timer() >= deadline)):
+                return False
+
+            current = frontier.get()
+            expanded += 1
+            self.expanded += 1
+            if stats is not None:
+                stats.expand(current)
+            if current == goal:
+                self._found = True
+                break
+
+            estimate = heuristic(goal, current)
+            if estimate < self._closest_estimate:
+                self._closest = current
+                self._closest_estimate = estimate
+
+            for next_coord in grid.get_cell(current).neighbors(player_size):
+                new_cost = cost_so_far[current] + math.hypot(next_coord[0] - current[0], next_coord[1] - current[1])
+                if new_cost >= max_cost:
+                    continue
+                if next_coord not in cost_so_far or new_cost < cost_so_far[next_coord]:
+                    cost_so_far[next_coord] = new_cost
+                    # on equal cost prefer the cell closer to the goal
+                    estimate = heuristic(goal, next_coord)
+                    frontier.put(next_coord, (new_cost + estimate, estimate))
+                    came_from[next_coord] = current
+                    if stats is not None:
+                        stats.push()
+
+        self._done = True
+        return True
+
+    def slices(self, max_nodes=None, max_time=None):
+        # generator that runs one step per iteration until the search is done
+        while not self.step(max_nodes, max_time):
+            yield self
+
+    def _path_to(self, coord):
+        # goal first like get_path returns it
+        path = []
+        while coord is not None:
+            path.append(coord)
+            coord = self._came_from[coord]
+        return path
+
+    def result(self):
+        # (path, cost) like get_path once the search is done, ([], -1) while it is not
+        if not self.found:
+            return [], -1
+        return self._path_to(self.goal), self._cost[self.goal]
+
+    def best_path(self):
+        # the path found or, while searching, the path to the expanded cell closest to the goal
+        if self.found:
+            return self.result()
+        if self._stale:
+            return [], -1
+        return self._path_to(self._closest), self._cost[self._closest]
+
+
+def step_searches(searches, max_time, max_nodes=None):
+    # Shares max_time seconds between the searches that are not done, each search gets an even
+    # part of the time that is left. Returns the searches that are still running.
+    running = [search for search in searches if not search.done]
+    deadline = default_timer() + max_time
+    for number, search in enumerate(running):
+        time_left = deadline - default_timer()
+        if time_left <= 0:
+            break
+        search.step(max_nodes, time_left / (len(running) - number))
+    return [search for search in running if not search.done]